@@ -0,0 +1,290 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+# ------------------------
+# IVF Index Over Title Embeddings
+# ------------------------
+# Inverted file index for L2-normalized embeddings: spherical k-means splits
+# the vectors into `n_lists` cells and a query is only compared with the
+# vectors of its `n_probe` closest cells. n_probe is calibrated so that a
+# sample of the indexed vectors finds at least `recall_target` of its exact
+# top-k neighbours. Entries are keyed (by normalized title), so a stored index
+# can be extended with new titles without retraining the centroids.
+#
+# On disk: <path>.npz with centroids, vectors and cell assignments, plus
+# <path>.json with the keys and settings, both replaced atomically.
+
+
+class IVFIndex:
+    """Approximate inner-product search over keyed unit vectors."""
+
+    def __init__(self, n_lists=None, n_probe=None, recall_target=0.95, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.recall_target = recall_target
+        self.seed = seed
+        self.model = None
+        self.keys = []
+        self.positions = {}
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int32)
+        self._layout = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    # ---- building ----
+    def build(self, keys, vectors, model=None, k=10):
+        """Trains centroids on `vectors`, indexes them and calibrates n_probe."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self.model = model
+        self.keys = list(keys)
+        self.positions = {key: pos for pos, key in enumerate(self.keys)}
+        self.vectors = vectors
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(vectors))))
+        self.centroids = spherical_kmeans(vectors, n_lists, seed=self.seed)
+        self.assignments = self._assign(vectors)
+        self._layout = None
+        if self.n_probe is None:
+            self.calibrate(k)
+        return self
+
+    def _assign(self, vectors):
+        return np.asarray((vectors @ self.centroids.T).argmax(axis=1), dtype=np.int32)
+
+    def add(self, keys, vectors):
+        """Appends entries for keys not indexed yet; centroids stay as they are."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        new = [r for r, key in enumerate(keys) if key not in self.positions]
+        if not new:
+            return 0
+        for r in new:
+            self.positions[keys[r]] = len(self.keys)
+            self.keys.append(keys[r])
+        self.vectors = np.concatenate([self.vectors, vectors[new]])
+        self.assignments = np.concatenate(
+            [self.assignments, self._assign(vectors[new])]
+        )
+        self._layout = None
+        return len(new)
+
+    @property
+    def layout(self):
+        """
+        (order, bounds, vectors) with entries grouped by cell.
+
+        Cell c holds the entry positions order[bounds[c]:bounds[c + 1]], and
+        the same slice of `vectors` holds their vectors, so a cell is scored
+        as one contiguous block.
+        """
+        if self._layout is None:
+            order = np.argsort(self.assignments, kind="stable")
+            bounds = np.searchsorted(
+                self.assignments[order], np.arange(len(self.centroids) + 1)
+            )
+            self._layout = (order, bounds, self.vectors[order])
+        return self._layout
+
+    # ---- searching ----
+    def search(self, queries, k=10, n_probe=None, chunk_size=512):
+        """
+        Approximate top-k (positions, scores) for each row of `queries`.
+
+        Queries are processed in chunks. Every probed cell is scored against
+        all queries of the chunk that probe it in one product and cut to its
+        own top-k, so a query only ever holds n_probe * k candidates, of
+        which the top-k are kept. Rows with fewer than k reachable entries
+        are padded with -1 / -inf.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n_probe = min(n_probe or self.n_probe or 1, len(self.centroids))
+        k = min(k, len(self))
+        positions = np.full((len(queries), k), -1, dtype=np.int64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        order, bounds, grouped = self.layout
+
+        for start in range(0, len(queries), chunk_size):
+            chunk = queries[start : start + chunk_size]
+            cells = np.argpartition(-(chunk @ self.centroids.T), n_probe - 1, axis=1)
+            cells = cells[:, :n_probe].ravel()
+            # Query j's i-th probe keeps its cell's top-k in columns i*k...
+            block = np.full((len(chunk), n_probe * k), -np.inf, dtype=np.float32)
+            columns = np.zeros((len(chunk), n_probe * k), dtype=np.int64)
+
+            # The (query, probe) pairs of the chunk, grouped by cell
+            probes = np.argsort(cells, kind="stable")
+            probe_bounds = np.searchsorted(
+                cells[probes], np.arange(len(self.centroids) + 1)
+            )
+            for cell in np.flatnonzero(np.diff(probe_bounds)):
+                low, high = bounds[cell], bounds[cell + 1]
+                if high == low:
+                    continue
+                pairs = probes[probe_bounds[cell] : probe_bounds[cell + 1]]
+                rows = pairs // n_probe
+                cell_scores = chunk[rows] @ grouped[low:high].T
+                if high - low > k:
+                    top = np.argpartition(-cell_scores, k - 1, axis=1)[:, :k]
+                    cell_scores = np.take_along_axis(cell_scores, top, axis=1)
+                else:
+                    top = np.arange(high - low)
+                cols = (pairs % n_probe)[:, None] * k + np.arange(cell_scores.shape[1])
+                block[rows[:, None], cols] = cell_scores
+                columns[rows[:, None], cols] = low + top
+
+            top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(block, top, axis=1)
+            ranked = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, ranked, axis=1)
+            top_scores = np.take_along_axis(top_scores, ranked, axis=1)
+            top = np.take_along_axis(columns, top, axis=1)
+            top = np.where(np.isneginf(top_scores), -1, order[top])
+
+            positions[start : start + len(chunk)] = top
+            scores[start : start + len(chunk)] = top_scores
+        return positions, scores
+
+    def exact_search(self, queries, k=10, chunk_size=512):
+        """Brute-force top-k positions, the reference for recall."""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+        positions = np.empty((len(queries), k), dtype=np.int64)
+        for start in range(0, len(queries), chunk_size):
+            scores = queries[start : start + chunk_size] @ self.vectors.T
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+            positions[start : start + len(scores)] = np.take_along_axis(
+                top, order, axis=1
+            )
+        return positions
+
+    def calibrate(self, k=10, queries=None, sample_size=500):
+        """
+        Smallest n_probe whose recall@k reaches recall_target.
+
+        Measured on `queries` if given, else on a sample of indexed vectors.
+        """
+        sample = None
+        if queries is None:
+            rng = np.random.default_rng(self.seed)
+            sample = rng.choice(len(self), min(sample_size, len(self)), replace=False)
+            queries = self.vectors[sample]
+        exact = without_self(self.exact_search(queries, k + 1), sample, k)
+
+        def reaches(n_probe):
+            approx, _ = self.search(queries, k + 1, n_probe)
+            return recall_at_k(without_self(approx, sample, k), exact) >= (
+                self.recall_target
+            )
+
+        # Double until the target is met, then bisect
+        low, high = 0, len(self.centroids)
+        n_probe = 1
+        while n_probe < high:
+            if reaches(n_probe):
+                high = n_probe
+                break
+            low, n_probe = n_probe, n_probe * 2
+        while high - low > 1:
+            middle = (low + high) // 2
+            if reaches(middle):
+                high = middle
+            else:
+                low = middle
+        self.n_probe = high
+        return self.n_probe
+
+    # ---- persistence ----
+    def save(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_arrays = path.with_name(f".{path.name}.npz.tmp")
+        with open(tmp_arrays, "wb") as f:
+            np.savez(
+                f,
+                vectors=self.vectors.astype(np.float16),
+                centroids=self.centroids,
+                assignments=self.assignments,
+            )
+        os.replace(tmp_arrays, path.with_suffix(".npz"))
+
+        meta = {
+            "model": self.model,
+            "n_lists": len(self.centroids),
+            "n_probe": self.n_probe,
+            "recall_target": self.recall_target,
+            "seed": self.seed,
+            "keys": self.keys,
+        }
+        tmp_meta = path.with_name(f".{path.name}.json.tmp")
+        tmp_meta.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_meta, path.with_suffix(".json"))
+
+    @classmethod
+    def load(cls, path):
+        """The stored index, or None if it is missing or unreadable."""
+        path = Path(path)
+        try:
+            meta = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+            arrays = np.load(path.with_suffix(".npz"))
+            index = cls(meta["n_lists"], meta["n_probe"], meta["recall_target"])
+            index.seed = meta["seed"]
+            index.model = meta["model"]
+            index.keys = meta["keys"]
+            index.positions = {key: pos for pos, key in enumerate(index.keys)}
+            index.vectors = arrays["vectors"].astype(np.float32)
+            index.vectors /= np.maximum(
+                np.linalg.norm(index.vectors, axis=1, keepdims=True), 1e-12
+            )
+            index.centroids = arrays["centroids"]
+            index.assignments = arrays["assignments"]
+        except (OSError, ValueError, KeyError) as e:
+            if path.with_suffix(".json").exists():
+                print(f"Warning: Ignoring unreadable ANN index: {e}")
+            return None
+        if len(index.keys) != len(index.vectors):
+            return None
+        return index
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=15, sample_size=20000, seed=0):
+    """Unit-norm centroids maximizing cosine similarity to their members."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        labels = (vectors @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        counts = np.bincount(labels, minlength=n_clusters)
+        # Empty cells restart from a random vector
+        empty = counts == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+def without_self(positions, sample, k):
+    """
+    Drops each sampled entry from its own neighbour list, keeping k columns.
+
+    An indexed vector always finds itself in its own cell, which would
+    overstate the recall for queries that are not in the index.
+    """
+    if sample is None:
+        return positions[:, :k]
+    kept = [row[row != own][:k] for row, own in zip(positions, sample)]
+    return np.array([np.pad(r, (0, k - len(r)), constant_values=-1) for r in kept])
+
+
+def recall_at_k(approx, exact):
+    """Share of the exact top-k positions that the approximate search found."""
+    found = sum(len(set(a[a >= 0]) & set(e[e >= 0])) for a, e in zip(approx, exact))
+    return found / max(1, int((exact >= 0).sum()))
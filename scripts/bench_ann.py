@@ -0,0 +1,101 @@
+import argparse
+import json
+import time
+from pathlib import Path
+
+import matcher
+from ann_index import IVFIndex, recall_at_k
+from bench_matcher import synthetic_catalog
+from embedders import BACKENDS, HashedNgramEmbedder, create_embedder
+
+# ------------------------
+# ANN Benchmark
+# ------------------------
+# Recall@k and query time of the IVF index against exact search, with the
+# synthetic schedule titles of bench_matcher as queries against their
+# attribute catalog. The "incremental" rows index 90% of the catalog, add the
+# rest with add() and measure again without retraining.
+#
+#   python scripts/bench_ann.py --sizes 1000,10000 --k 10 --output ann.json
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 4)
+
+
+def measure(index, queries, k):
+    exact, exact_seconds = timed(index.exact_search, queries, k)
+    (approx, _), ann_seconds = timed(index.search, queries, k)
+    return {
+        "n_probe": index.n_probe,
+        "n_lists": len(index.centroids),
+        "recall_at_k": round(recall_at_k(approx, exact), 4),
+        "exact_seconds": exact_seconds,
+        "ann_seconds": ann_seconds,
+        "speedup": round(exact_seconds / ann_seconds, 2) if ann_seconds else None,
+    }
+
+
+def run_case(size, embedder_name, k, recall_target, seed):
+    schedules, attributes, _, _ = synthetic_catalog(size, seed)
+    model = create_embedder(embedder_name)
+    if isinstance(model, HashedNgramEmbedder):
+        model.fit(matcher.normalize_title(r["title"]) for r in schedules + attributes)
+    candidates = matcher.TitleIndex(attributes, model)
+    queries = matcher.TitleIndex(schedules, model).embeddings
+    keys, vectors = candidates.norms, candidates.embeddings
+
+    index, build_seconds = timed(
+        IVFIndex(recall_target=recall_target).build, keys, vectors, k=k
+    )
+    full = {"build_seconds": build_seconds, **measure(index, queries, k)}
+
+    split = int(len(keys) * 0.9)
+    partial = IVFIndex(recall_target=recall_target).build(
+        keys[:split], vectors[:split], k=k
+    )
+    _, add_seconds = timed(partial.add, keys, vectors)
+    incremental = {"add_seconds": add_seconds, **measure(partial, queries, k)}
+
+    return {
+        "size": size,
+        "candidates": len(keys),
+        "queries": len(queries),
+        "full": full,
+        "incremental": incremental,
+    }
+
+
+# ------------------------
+# Main Execution
+# ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark scripts/ann_index.py")
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--recall-target", type=float, default=0.95)
+    parser.add_argument("--embedder", choices=BACKENDS, default="hashed")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = {"embedder": args.embedder, "k": args.k, "cases": []}
+    for size in (int(s) for s in args.sizes.split(",")):
+        case = run_case(size, args.embedder, args.k, args.recall_target, args.seed)
+        results["cases"].append(case)
+        for kind in ("full", "incremental"):
+            row = case[kind]
+            print(
+                f"{size:>6} {kind:<11} recall@{args.k} {row['recall_at_k']:.3f}  "
+                f"n_probe {row['n_probe']}/{row['n_lists']}  "
+                f"speedup {row['speedup']}x"
+            )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"Saved benchmark results to {args.output}")
+    else:
+        print(output)
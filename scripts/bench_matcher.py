@@ -0,0 +1,449 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matcher
+from embedders import BACKENDS, HashedNgramEmbedder, create_embedder
+
+# ------------------------
+# Matcher Benchmark
+# ------------------------
+# Times merge_schedules_and_attributes / merge_with_posters on synthetic
+# programmes of increasing size and checks match accuracy, both on the
+# synthetic gold mapping and on the committed week of real data.
+#
+# --stream-check N streams N and then 10N schedules through the --stream
+# merge against the same catalog and fails if the memory held afterwards
+# grew with the input. With --min-attribute-accuracy / --min-poster-accuracy
+# it also fails when a synthetic run scores below them on the gold mapping
+# (CI runs it that way, see .github/workflows/matcher-bench.yml).
+#
+#   python scripts/bench_matcher.py --sizes 100,1000 --output bench.json
+
+THRESHOLD = 0.2
+DATA_DIR = Path("src/data")
+
+MODES = {
+    "exhaustive": {"blocking": False, "cascade_margin": None},
+    "blocking": {"blocking": True, "cascade_margin": None},
+    "cascade": {"blocking": False, "cascade_margin": matcher.CASCADE_MARGIN},
+    "parallel": {"blocking": False, "cascade_margin": None, "workers": 4},
+}
+
+
+# ------------------------
+# Gold Mapping From Committed Data
+# ------------------------
+def reference_gold(data_dir=DATA_DIR):
+    """
+    Schedule title -> (attribute title, poster title) as committed.
+
+    source_movie_data.json keeps the attribute fields of the matched record
+    (only posterUrl is overwritten by the poster match), so the attribute
+    record is the one whose remaining fields all agree.
+    """
+    merged = json.loads((data_dir / "source_movie_data.json").read_text("utf-8"))
+    attributes = json.loads((data_dir / "movieAttributes.json").read_text("utf-8"))
+    posters = json.loads((data_dir / "moviePosterUrls.json").read_text("utf-8"))
+    schedule_keys = {"title", "attributes", "duration", "showtimes", "posterUrl"}
+
+    gold = {}
+    poster_by_src = {p["src"]: p["title"] for p in reversed(posters)}
+    for record in merged:
+        attribute = next(
+            (
+                a["title"]
+                for a in attributes
+                if all(
+                    record.get(k) == v for k, v in a.items() if k not in schedule_keys
+                )
+            ),
+            None,
+        )
+        gold[record["title"]] = (attribute, poster_by_src.get(record.get("posterUrl")))
+    return gold
+
+
+# ------------------------
+# Synthetic Catalogs
+# ------------------------
+ARTICLES = ["Der", "Die", "Das", "The", "Ein", "Eine"]
+SYLLABLES = (
+    "ka ro mi lu ten ber sch wal don ria stein ho fen gar ma nel tor vi sa ling ur bach"
+).split()
+
+
+def _word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def synthetic_title(rng, vocabulary):
+    words = [rng.choice(vocabulary) for _ in range(rng.randint(1, 3))]
+    if rng.random() < 0.4:
+        words.insert(0, rng.choice(ARTICLES))
+    title = " ".join(words)
+    if rng.random() < 0.3:
+        subtitle = " ".join(rng.choice(vocabulary) for _ in range(rng.randint(1, 3)))
+        title += rng.choice([": ", " - "]) + subtitle
+    if rng.random() < 0.1:
+        title += f" {rng.randint(2, 4)}"
+    return title
+
+
+def perturb(rng, title):
+    """Applies one of the differences seen between kinoheld and cinema titles."""
+    kind = rng.choice(["upper", "year", "omu", "subtitle", "none", "none"])
+    if kind == "upper":
+        return title.upper().replace(" UND ", " & ")
+    if kind == "year":
+        return f"{title} ({rng.randint(1960, 2026)})"
+    if kind == "omu":
+        return f"{title} - {rng.choice(['OmU', 'OmdU', 'OV'])}"
+    if kind == "subtitle":
+        for sep in (": ", " - "):
+            if sep in title:
+                return title.split(sep)[0]
+    return title
+
+
+def synthetic_catalog(size, seed=0):
+    """
+    Schedules, attributes and posters for `size` films plus the gold mapping.
+
+    Every film has an attribute record; about 10% of the schedules are extra
+    events without one, and about 75% of the films have a poster.
+    """
+    rng = random.Random(seed)
+    real = [
+        a["title"]
+        for a in json.loads((DATA_DIR / "movieAttributes.json").read_text("utf-8"))
+    ]
+    vocabulary = sorted({w for t in real for w in t.split() if w.isalpha()})
+    vocabulary += [_word(rng) for _ in range(max(200, size // 2))]
+
+    films = list(dict.fromkeys(synthetic_title(rng, vocabulary) for _ in range(size)))
+    attributes = [
+        {"title": perturb(rng, t), "director": f"D{i}"} for i, t in enumerate(films)
+    ]
+    posters = [
+        {"title": perturb(rng, t), "src": f"https://posters.invalid/{i}.jpg"}
+        for i, t in enumerate(films)
+        if rng.random() < 0.75
+    ]
+    poster_of = {int(p["src"].rsplit("/", 1)[1][:-4]): p["title"] for p in posters}
+
+    schedules, gold = [], {}
+    for i, film in enumerate(films):
+        title = perturb(rng, film)
+        schedules.append({"title": title})
+        gold.setdefault(title, (attributes[i]["title"], poster_of.get(i)))
+    for _ in range(size // 10):
+        title = " ".join(_word(rng) for _ in range(rng.randint(2, 4)))
+        schedules.append({"title": title})
+        gold.setdefault(title, (None, None))
+    rng.shuffle(schedules)
+    return schedules, attributes, posters, gold
+
+
+# ------------------------
+# Measurement
+# ------------------------
+@contextlib.contextmanager
+def timed(timings, stage):
+    start = time.perf_counter()
+    yield
+    timings[stage] = round(time.perf_counter() - start, 4)
+
+
+def accuracy(merged, gold):
+    """Share of schedules whose attribute / poster match agrees with gold."""
+    attr_ok = poster_ok = 0
+    for movie in merged:
+        attribute, poster = gold[movie["title"]]
+        attr_ok += movie["_match"] == attribute
+        poster_ok += movie.get("_poster") == poster
+    return {
+        "attributes": round(attr_ok / len(merged), 4),
+        "posters": round(poster_ok / len(merged), 4),
+    }
+
+
+def run_case(schedules, attributes, posters, gold, embedder_name, mode):
+    options = MODES[mode]
+    model = create_embedder(embedder_name)
+    if isinstance(model, HashedNgramEmbedder):
+        model.fit(
+            matcher.normalize_title(r["title"])
+            for r in schedules + attributes + posters
+        )
+
+    # Per stage, on indexes built up front
+    stages = {}
+    with timed(stages, "index"):
+        query = matcher.TitleIndex(schedules, model)
+        candidates = matcher.TitleIndex(attributes, model)
+    if options["cascade_margin"] is None:
+        with timed(stages, "embed"):
+            query.embeddings, candidates.embeddings
+    with timed(stages, "score"), contextlib.redirect_stdout(io.StringIO()):
+        blocker = matcher.CandidateBlocker(candidates) if options["blocking"] else None
+        matches = matcher.find_best_matches(
+            query,
+            candidates,
+            model,
+            THRESHOLD,
+            blocker=blocker,
+            cascade_margin=options["cascade_margin"],
+            workers=options.get("workers", 1),
+        )
+
+    # End to end, as run by the weekly job
+    end_to_end = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        with timed(end_to_end, "merge_schedules_and_attributes"):
+            merged = matcher.merge_schedules_and_attributes(
+                schedules, attributes, model, THRESHOLD, **options
+            )
+        with timed(end_to_end, "merge_with_posters"):
+            matcher.merge_with_posters(merged, posters, model, THRESHOLD, **options)
+
+    poster_by_src = {p["src"]: p["title"] for p in reversed(posters)}
+    for movie, (match, _) in zip(merged, matches):
+        movie["_match"] = match
+        movie["_poster"] = poster_by_src.get(movie.get("posterUrl"))
+
+    total = sum(end_to_end.values())
+    return {
+        "schedules": len(schedules),
+        "attributes": len(attributes),
+        "posters": len(posters),
+        "mode": mode,
+        "stages": stages,
+        "end_to_end": end_to_end,
+        "titles_per_second": round(len(schedules) / total, 1) if total else None,
+        "accuracy": accuracy(merged, gold),
+    }
+
+
+def add_speedups(results):
+    """
+    Adds speedup_over_exhaustive (titles/s ratio) to every run of a catalog
+    on which the exhaustive mode ran too.
+    """
+    for runs in (results["reference"], results["synthetic"]):
+        serial = {
+            run.get("size"): run["titles_per_second"]
+            for run in runs
+            if run["mode"] == "exhaustive" and run.get("titles_per_second")
+        }
+        for run in runs:
+            if run["mode"] == "exhaustive" or not run.get("titles_per_second"):
+                continue
+            if run.get("size") in serial:
+                run["speedup_over_exhaustive"] = round(
+                    run["titles_per_second"] / serial[run.get("size")], 2
+                )
+
+
+def accuracy_failures(results, minimum):
+    """Synthetic runs whose accuracy is below `minimum` ({kind: share})."""
+    failures = []
+    for result in results["synthetic"]:
+        for kind, share in result.get("accuracy", {}).items():
+            if minimum.get(kind) is not None and share < minimum[kind]:
+                failures.append(
+                    f"{result['size']} {result['mode']}: {kind} accuracy "
+                    f"{share} < {minimum[kind]}"
+                )
+    return failures
+
+
+def run_reference(embedder_name, mode):
+    """Accuracy and timing on the committed week against its own output."""
+    load = lambda name: json.loads((DATA_DIR / name).read_text("utf-8"))
+    return run_case(
+        load("movieSchedules.json"),
+        load("movieAttributes.json"),
+        load("moviePosterUrls.json"),
+        reference_gold(),
+        embedder_name,
+        mode,
+    )
+
+
+# ------------------------
+# Streaming Memory
+# ------------------------
+STREAM_CATALOG_SIZE = 200
+STREAM_GROWTH_MB = 0.25  # allowed growth of the memory held from N to 10N
+
+
+def stream_memory(catalog, count, embedder_name):
+    """
+    Memory (tracemalloc, MB) held after and at most during streaming `count`
+    schedules, the catalog's repeated, set up as main_stream does.
+    """
+    schedules, attributes, posters, _ = catalog
+    matcher.REPORT.reset()
+    matcher.REPORT.max_items = matcher.STREAM_MAX_ITEMS
+    model = create_embedder(embedder_name)
+    if isinstance(model, HashedNgramEmbedder):
+        model.fit(matcher.normalize_title(r["title"]) for r in attributes + posters)
+    attribute_index = matcher.TitleIndex(attributes, model)
+    poster_index = matcher.TitleIndex(posters, model)
+    attribute_index.embeddings, poster_index.embeddings
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    with open(os.devnull, "w") as out, contextlib.redirect_stdout(io.StringIO()):
+        matcher.stream_merge(
+            itertools.islice(itertools.cycle(schedules), count),
+            attribute_index,
+            poster_index,
+            model,
+            THRESHOLD,
+            out,
+        )
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "schedules": count,
+        "retained_mb": round((current - baseline) / 1e6, 3),
+        "peak_mb": round((peak - baseline) / 1e6, 3),
+    }
+
+
+def stream_check(count, embedder_name, seed):
+    """stream_memory for `count` and 10 * `count` schedules, each in a fresh process."""
+    catalog = synthetic_catalog(STREAM_CATALOG_SIZE, seed)
+    runs = []
+    for n in (count, 10 * count):
+        with ProcessPoolExecutor(1) as pool:
+            runs.append(pool.submit(stream_memory, catalog, n, embedder_name).result())
+    growth = runs[1]["retained_mb"] - runs[0]["retained_mb"]
+    return {
+        "runs": runs,
+        "growth_mb": round(growth, 3),
+        "max_growth_mb": STREAM_GROWTH_MB,
+        "passed": growth <= STREAM_GROWTH_MB,
+    }
+
+
+# ------------------------
+# Main Execution
+# ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark scripts/matcher.py")
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--modes", default="exhaustive,blocking,cascade,parallel")
+    parser.add_argument("--embedder", choices=BACKENDS, default="hashed")
+    parser.add_argument(
+        "--max-exhaustive",
+        type=int,
+        default=10000,
+        help="Skip all but the blocking mode above this many titles",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=MODES["parallel"]["workers"],
+        help="Processes used by the parallel mode",
+    )
+    parser.add_argument(
+        "--stream-check",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Also check that streaming 10N schedules holds no more memory than N",
+    )
+    parser.add_argument(
+        "--min-attribute-accuracy",
+        type=float,
+        help="Fail if a synthetic run matches fewer attributes than this share",
+    )
+    parser.add_argument(
+        "--min-poster-accuracy",
+        type=float,
+        help="Fail if a synthetic run matches fewer posters than this share",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+
+    if 0 < args.stream_check < matcher.STREAM_MAX_ITEMS:
+        # Below that the report lists are still filling up
+        parser.error(f"--stream-check needs N >= {matcher.STREAM_MAX_ITEMS}")
+    modes = args.modes.split(",")
+    MODES["parallel"]["workers"] = args.workers
+    results = {
+        "embedder": args.embedder,
+        "threshold": THRESHOLD,
+        "workers": args.workers,
+        "reference": [run_reference(args.embedder, mode) for mode in modes],
+        "synthetic": [],
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        catalog = synthetic_catalog(size, args.seed)
+        for mode in modes:
+            if mode != "blocking" and size > args.max_exhaustive:
+                results["synthetic"].append(
+                    {"size": size, "mode": mode, "skipped": True}
+                )
+                continue
+            result = {"size": size, **run_case(*catalog, args.embedder, mode)}
+            results["synthetic"].append(result)
+            print(
+                f"{size:>6} {mode:<10} {result['titles_per_second']:>9} titles/s  "
+                f"accuracy {result['accuracy']}"
+            )
+
+    add_speedups(results)
+    for run in results["synthetic"]:
+        if "speedup_over_exhaustive" in run:
+            print(
+                f"{run['size']:>6} {run['mode']:<10} "
+                f"{run['speedup_over_exhaustive']}x over exhaustive"
+            )
+
+    failures = accuracy_failures(
+        results,
+        {
+            "attributes": args.min_attribute_accuracy,
+            "posters": args.min_poster_accuracy,
+        },
+    )
+    results["accuracy_failures"] = failures
+    for failure in failures:
+        print(f"✗ {failure}")
+    failed = bool(failures)
+    if args.stream_check:
+        check = stream_check(args.stream_check, args.embedder, args.seed)
+        results["stream_memory"] = check
+        failed = failed or not check["passed"]
+        print(
+            "stream memory "
+            + ", ".join(
+                f"{r['schedules']} schedules {r['retained_mb']} MB held "
+                f"({r['peak_mb']} MB peak)"
+                for r in check["runs"]
+            )
+            + f": {'ok' if check['passed'] else 'GREW'}"
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"Saved benchmark results to {args.output}")
+    else:
+        print(output)
+    if failed:
+        sys.exit(1)
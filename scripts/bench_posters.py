@@ -0,0 +1,297 @@
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import getPosters
+from run_report import REPORT, peak_rss_mb
+
+# ------------------------
+# Poster Benchmark
+# ------------------------
+# Times the poster half of the weekly job:
+#
+#   download_cold      download_posters into an empty directory, from a local
+#                      HTTP server serving the committed posters with
+#                      --latency seconds of delay per request
+#   download_warm      the same again, every poster revalidated (304)
+#   render_committed   process_all_posters_for_variants over src/data/posters
+#   render_current     the same again, every variant up to date
+#   render_synthetic   --synthetic generated posters of --synthetic-size
+#
+# Each case runs in a fresh process, so its peak RSS is its own. Per case:
+# wall time, posters/s, output bytes, and the REPORT stage times and
+# counters (decode, blur, resize, logo, encode, ...) that getPosters.py also
+# writes to src/data/posters.run.json at runtime.
+#
+#   python scripts/bench_posters.py --latency 0.05 --output bench.json
+
+DATA_DIR = Path("src/data")
+POSTERS_DIR = DATA_DIR / "posters"
+
+
+# ------------------------
+# Local Poster Server
+# ------------------------
+class SlowHandler(SimpleHTTPRequestHandler):
+    latency = 0.0
+
+    def send_head(self):
+        time.sleep(self.latency)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_directory(directory, latency):
+    """Serves `directory` on a free local port; yields the base URL."""
+    handler = type("Handler", (SlowHandler,), {"latency": latency})
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(handler, directory=str(directory))
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def reference_for(poster_files, base_url):
+    """movies-reference.json content pointing at the served posters."""
+    return {
+        str(i): {
+            "title": f.stem.replace("-", " "),
+            "slug": f.stem,
+            "posterUrl": f"{base_url}/{f.name}",
+        }
+        for i, f in enumerate(sorted(poster_files))
+    }
+
+
+# ------------------------
+# Synthetic Posters
+# ------------------------
+def synthetic_poster(path, size, seed):
+    """
+    A poster-like image: smooth random shapes plus grain.
+
+    The coarse field differs per seed, so the posters do not look alike to
+    the perceptual hash and none of them is skipped as a duplicate.
+    """
+    rng = np.random.default_rng(seed)
+    width, height = size
+    coarse = Image.fromarray(
+        rng.integers(0, 256, (12, 8, 3), dtype=np.uint8), "RGB"
+    ).resize(size, Image.Resampling.BICUBIC)
+    grain = rng.standard_normal((height, width, 3), dtype=np.float32) * 12
+    pixels = np.clip(np.asarray(coarse, dtype=np.float32) + grain, 0, 255)
+    Image.fromarray(pixels.astype(np.uint8), "RGB").save(path, quality=92)
+
+
+def synthetic_posters(directory, count, size, seed=0):
+    """`count` posters, every fourth one a PNG (no reduced JPEG decoding)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    for i in range(count):
+        extension = "png" if i % 4 == 3 else "jpg"
+        synthetic_poster(directory / f"synthetic-{i}.{extension}", size, seed + i)
+
+
+# ------------------------
+# Measurement
+# ------------------------
+def directory_bytes(directory):
+    """Bytes of the files below `directory`, hardlinks counted once."""
+    seen = set()
+    total = 0
+    for path in Path(directory).rglob("*"):
+        if path.is_file() and not path.name.startswith("."):
+            stat = path.stat()
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def measure(run, posters):
+    """Runs `run` quietly; returns its metrics dict."""
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        output_bytes = run()
+    seconds = time.perf_counter() - start
+    report = REPORT.to_dict()
+    return {
+        "posters": posters,
+        "seconds": round(seconds, 3),
+        "posters_per_second": round(posters / seconds, 2) if seconds else None,
+        "output_bytes": output_bytes,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_children_mb": peak_rss_mb(children=True),
+        "stages": report["stages"],
+        "counters": report["counters"],
+        "distributions": report["distributions"],
+    }
+
+
+def download_case(workdir, latency, workers, rate, warm):
+    """download_posters of all committed posters from the local server."""
+    poster_files = [
+        f for f in POSTERS_DIR.iterdir() if f.suffix in getPosters.POSTER_EXTENSIONS
+    ]
+    output = workdir / "posters"
+    with serve_directory(POSTERS_DIR, latency) as base_url:
+        reference = workdir / "movies-reference.json"
+        reference.write_text(json.dumps(reference_for(poster_files, base_url)))
+        download = partial(
+            getPosters.download_posters,
+            reference,
+            output,
+            max_workers=workers,
+            rate_per_host=rate,
+        )
+        if warm:
+            with contextlib.redirect_stdout(io.StringIO()):
+                download()
+            REPORT.reset()
+        return measure(
+            lambda: (download(), directory_bytes(output))[1], len(poster_files)
+        )
+
+
+def render_case(workdir, source, workers, warm):
+    """process_all_posters_for_variants over a copy of `source`."""
+    posters = workdir / "posters"
+    shutil.copytree(source, posters)
+    variants = workdir / "variants"
+    render = partial(
+        getPosters.process_all_posters_for_variants,
+        posters,
+        variants,
+        workers=workers,
+        renditions_path=workdir / "renditions.json",
+    )
+    if warm:
+        with contextlib.redirect_stdout(io.StringIO()):
+            render()
+        REPORT.reset()
+    count = sum(1 for f in posters.iterdir() if f.is_file())
+    return measure(lambda: (render(), directory_bytes(variants))[1], count)
+
+
+def run_case(name, args, synthetic_dir=None):
+    """Runs one case in this (fresh) process, in a scratch directory."""
+    with tempfile.TemporaryDirectory(prefix="bench-posters-") as tmp:
+        workdir = Path(tmp)
+        if name.startswith("download"):
+            return download_case(
+                workdir, args.latency, args.downloads, args.rate, name.endswith("warm")
+            )
+        if name == "render_synthetic":
+            return render_case(workdir, synthetic_dir, args.workers, warm=False)
+        return render_case(
+            workdir, POSTERS_DIR, args.workers, warm=name == "render_current"
+        )
+
+
+CASES = (
+    "download_cold",
+    "download_warm",
+    "render_committed",
+    "render_current",
+    "render_synthetic",
+)
+
+
+# ------------------------
+# Main Execution
+# ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark poster downloads and variant rendering"
+    )
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds the local server waits before each response",
+    )
+    parser.add_argument(
+        "--downloads", type=int, default=8, help="Concurrent poster downloads"
+    )
+    parser.add_argument(
+        "--rate", type=float, default=4.0, help="Requests per second per host"
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Variant rendering processes (default: cores)"
+    )
+    parser.add_argument(
+        "--synthetic", type=int, default=8, help="Synthetic posters to render"
+    )
+    parser.add_argument(
+        "--synthetic-size",
+        default="4000x6000",
+        help="WIDTHxHEIGHT of the synthetic posters",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    args = parser.parse_args()
+    args.synthetic_size = tuple(int(n) for n in args.synthetic_size.split("x"))
+
+    cases = args.cases.split(",")
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(sorted(unknown))}")
+
+    results = {
+        "latency": args.latency,
+        "downloads": args.downloads,
+        "rate_per_host": args.rate,
+        "workers": args.workers or getPosters.available_cores(),
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="bench-synthetic-") as synthetic_dir:
+        if "render_synthetic" in cases:
+            # In a process of its own, the cases inherit this one's peak RSS
+            with ProcessPoolExecutor(1) as pool:
+                pool.submit(
+                    synthetic_posters,
+                    Path(synthetic_dir),
+                    args.synthetic,
+                    args.synthetic_size,
+                    args.seed,
+                ).result()
+        for name in cases:
+            # A fresh process per case, so REPORT starts from zero and the
+            # peak RSS is that of the case
+            with ProcessPoolExecutor(1) as pool:
+                result = pool.submit(run_case, name, args, synthetic_dir).result()
+            results["cases"][name] = result
+            print(
+                f"{name:<17} {result['seconds']:>8.2f}s "
+                f"{result['posters_per_second']:>8} posters/s  "
+                f"{result['output_bytes'] / 1e6:>7.1f} MB  peak RSS "
+                f"{result['peak_rss_mb']} MB (workers "
+                f"{result['peak_rss_children_mb']} MB)"
+            )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+        print(f"Saved benchmark results to {args.output}")
+    else:
+        print(output)
@@ -0,0 +1,171 @@
+import math
+import zlib
+from typing import Protocol
+
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+from run_report import REPORT
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+# ------------------------
+# Embedder Interface
+# ------------------------
+class Embedder(Protocol):
+    """Anything that turns normalized titles into L2-normalized float32 rows."""
+
+    name: str
+
+    def encode_batch(self, titles: list[str]) -> np.ndarray: ...
+
+
+def _normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+# ------------------------
+# SentenceTransformer Backend
+# ------------------------
+class SentenceTransformerEmbedder:
+    """
+    Multilingual sentence embeddings.
+
+    sentence_transformers (and torch with it) is only imported and the model
+    only loaded on the first encode.
+    """
+
+    def __init__(self, model_name=MODEL_NAME):
+        self.name = model_name
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with REPORT.stage("model_load"):
+                from sentence_transformers import SentenceTransformer
+
+                self._model = SentenceTransformer(self.name)
+        return self._model
+
+    def encode_batch(self, titles):
+        titles = list(titles)
+        if not titles:
+            return np.zeros((0, 0), dtype=np.float32)
+        model = self.model
+        REPORT.count("encode_calls")
+        REPORT.count("titles_embedded", len(titles))
+        with REPORT.stage("model_encode"):
+            return _normalize_rows(
+                model.encode(titles, convert_to_numpy=True, normalize_embeddings=True)
+            )
+
+
+# ------------------------
+# Hashed N-gram Backend
+# ------------------------
+class HashedNgramEmbedder:
+    """
+    Dependency-free embeddings from hashed character n-grams.
+
+    Every n-gram of the padded title is hashed (crc32, stable across runs and
+    processes) into one of `dim` signed buckets with a sublinear term
+    frequency. After fit() the buckets are additionally weighted by their
+    inverse document frequency over the fitted titles, TF-IDF style.
+    """
+
+    def __init__(self, dim=1024, ngram_range=(2, 4)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.idf = None
+        self.name = f"hashed-ngrams-{dim}-{ngram_range[0]}-{ngram_range[1]}"
+
+    def _buckets(self, title):
+        padded = f" {title} "
+        counts = {}
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            for i in range(len(padded) - n + 1):
+                h = zlib.crc32(padded[i : i + n].encode("utf-8"))
+                bucket = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+                counts[bucket] = counts.get(bucket, 0) + 1
+        return counts
+
+    def fit(self, titles):
+        """Learns bucket IDF weights from a corpus of normalized titles."""
+        titles = list(titles)
+        df = np.zeros(self.dim)
+        for title in titles:
+            for bucket in {b for b, _ in self._buckets(title)}:
+                df[bucket] += 1
+        self.idf = np.log((1 + len(titles)) / (1 + df)) + 1
+        return self
+
+    def encode_batch(self, titles):
+        titles = list(titles)
+        REPORT.count("encode_calls")
+        REPORT.count("titles_embedded", len(titles))
+        vectors = np.zeros((len(titles), self.dim), dtype=np.float32)
+        for row, title in enumerate(titles):
+            for (bucket, sign), count in self._buckets(title).items():
+                vectors[row, bucket] += sign * (1 + math.log(count))
+        if self.idf is not None:
+            vectors *= self.idf.astype(np.float32)
+        return _normalize_rows(vectors)
+
+
+# ------------------------
+# Caching Wrapper
+# ------------------------
+class CachedEmbedder:
+    """Serves repeated titles from an EmbeddingCache, encodes only the misses."""
+
+    def __init__(self, backend, cache):
+        self.backend = backend
+        self.cache = cache
+        self.name = backend.name
+
+    def encode_batch(self, titles):
+        titles = list(titles)
+        vectors = {}
+        for title in titles:
+            if title not in vectors:
+                vector = self.cache.get(title)
+                if vector is not None:
+                    vectors[title] = vector
+
+        missing = list(dict.fromkeys(t for t in titles if t not in vectors))
+        REPORT.count("embedding_cache_hits", len(titles) - len(missing))
+        REPORT.count("embedding_cache_misses", len(missing))
+        if missing:
+            for title, vector in zip(missing, self.backend.encode_batch(missing)):
+                vectors[title] = vector
+                self.cache.put(title, vector)
+
+        if not titles:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([vectors[t] for t in titles])
+
+
+BACKENDS = ("sentence-transformers", "hashed")
+
+
+def create_embedder(
+    backend="sentence-transformers", model_name=MODEL_NAME, cache_dir=None
+):
+    """
+    Builds an embedder by backend name.
+
+    Only the SentenceTransformer backend is worth caching on disk; hashed
+    n-grams are cheaper to recompute than to look up.
+    """
+    if backend == "hashed":
+        return HashedNgramEmbedder()
+    if backend != "sentence-transformers":
+        raise ValueError(f"Unknown embedder backend: {backend}")
+    embedder = SentenceTransformerEmbedder(model_name)
+    if cache_dir is not None:
+        embedder = CachedEmbedder(embedder, EmbeddingCache(cache_dir, model_name))
+    return embedder
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+# ------------------------
+# Persistent Embedding Cache
+# ------------------------
+# One directory per model:
+#   index.json          {"model", "dim", "vectors", "entries": {key: [row, last_used_day]}}
+#   vectors-<id>.npy    float16 matrix, one row per entry, memory-mapped on load
+# Keys are content addressed (sha1 of model name + normalized title), so the
+# directory can be committed or restored as a CI cache without clashes. Every
+# save writes a fresh vectors file before atomically swapping the index, so an
+# interrupted run never leaves the index pointing at rows that do not exist.
+
+
+def cache_key(model_name: str, title: str) -> str:
+    """Content address of one (model, normalized title) pair."""
+    return hashlib.sha1(f"{model_name}\n{title}".encode("utf-8")).hexdigest()
+
+
+def _today() -> int:
+    return int(time.time() // 86400)
+
+
+class EmbeddingCache:
+    """On-disk store of L2-normalized title embeddings for a single model."""
+
+    def __init__(self, directory, model_name, max_entries=20000, max_age_days=180):
+        self.model_name = model_name
+        self.directory = Path(directory) / re.sub(r"[^\w.-]+", "_", model_name)
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+
+        self.entries = {}  # key -> [row in self.vectors, last used day]
+        self.vectors = None
+        self.vectors_file = None
+        self.pending = {}  # key -> float32 vector not yet written
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self._load()
+
+    def _load(self):
+        index_path = self.directory / "index.json"
+        if not index_path.exists():
+            return
+        try:
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+            if index.get("model") != self.model_name:
+                return
+            self.vectors_file = index["vectors"]
+            self.vectors = np.load(self.directory / self.vectors_file, mmap_mode="r")
+            self.entries = {k: list(v) for k, v in index["entries"].items()}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: Ignoring unreadable embedding cache: {e}")
+            self.entries, self.vectors, self.vectors_file = {}, None, None
+
+    def __len__(self):
+        return len(self.entries) + len(self.pending)
+
+    def get(self, title):
+        """Returns the cached float32 vector for a normalized title, or None."""
+        key = cache_key(self.model_name, title)
+        if key in self.pending:
+            self.hits += 1
+            return self.pending[key]
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if entry[1] != _today():
+            entry[1] = _today()
+            self.dirty = True
+        vector = np.asarray(self.vectors[entry[0]], dtype=np.float32)
+        return vector / max(np.linalg.norm(vector), 1e-12)
+
+    def put(self, title, vector):
+        self.pending[cache_key(self.model_name, title)] = np.asarray(
+            vector, dtype=np.float32
+        )
+        self.dirty = True
+
+    def _evict(self, stamps):
+        """Drops keys unused for max_age_days, then the least recently used."""
+        cutoff = _today() - self.max_age_days
+        live = {k: day for k, day in stamps.items() if day >= cutoff}
+        if len(live) > self.max_entries:
+            newest = sorted(live.items(), key=lambda kv: kv[1], reverse=True)
+            live = dict(newest[: self.max_entries])
+        return live
+
+    def save(self):
+        """Writes pending vectors and usage stamps back to disk."""
+        if not self.dirty:
+            return
+
+        stamps = {k: day for k, (_, day) in self.entries.items()}
+        stamps.update({k: _today() for k in self.pending})
+        live = self._evict(stamps)
+        if not live:
+            return
+
+        keys = sorted(live)
+        matrix = np.asarray(
+            [
+                (
+                    self.pending[k]
+                    if k in self.pending
+                    else self.vectors[self.entries[k][0]]
+                )
+                for k in keys
+            ],
+            dtype=np.float16,
+        )
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha1(matrix.tobytes()).hexdigest()[:12]
+        vectors_file = f"vectors-{digest}.npy"
+        tmp_vectors = self.directory / f".{vectors_file}.tmp"
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_vectors, self.directory / vectors_file)
+
+        index = {
+            "model": self.model_name,
+            "dim": int(matrix.shape[1]),
+            "vectors": vectors_file,
+            "entries": {key: [row, live[key]] for row, key in enumerate(keys)},
+        }
+        tmp_index = self.directory / ".index.json.tmp"
+        tmp_index.write_text(json.dumps(index, sort_keys=True), encoding="utf-8")
+        os.replace(tmp_index, self.directory / "index.json")
+
+        old_file = self.vectors_file
+        self.vectors = np.load(self.directory / vectors_file, mmap_mode="r")
+        self.vectors_file = vectors_file
+        self.entries = {k: list(v) for k, v in index["entries"].items()}
+        self.pending = {}
+        self.dirty = False
+        if old_file and old_file != vectors_file:
+            try:
+                (self.directory / old_file).unlink()
+            except OSError:
+                pass
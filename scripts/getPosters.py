@@ -2,17 +2,139 @@ import json
 import requests
 import os
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urlencode, urlparse
 import time
+import hashlib
+import itertools
+import math
+import shutil
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from poster_downloader import DownloadJob, PosterDownloader, PosterManifest
+from poster_hashes import PosterHashes
+from run_report import REPORT, summarize
+
+POSTER_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+# Canvas sizes of the social media variants
+OG_SIZE = (1200, 630)
+SQUARE_SIZE = 600
+CDN_FORMATS = {".jpg": "jpg", ".jpeg": "jpg", ".png": "png", ".webp": "webp"}
+
+# Render template of the variants. The variant build manifest stores a
+# fingerprint of it, so changing a value here (or bumping the version after
+# changing the drawing code) re-renders every poster on the next run.
+VARIANT_TEMPLATE_VERSION = 2
+BLUR_RADIUS = 15
+BACKGROUND_BRIGHTNESS = 0.3  # 30% as bright (70% darker)
+# The blurred backgrounds are computed at 1/BACKDROP_SCALE of the canvas size
+# and scaled up, the blur leaves no detail that the upscaling could lose
+BACKDROP_SCALE = 4
+# Poster renditions for srcset: width -> byte budget, for WebP and JPEG
+POSTER_WIDTHS = {240: 30_000, 480: 80_000, 720: 160_000}
+# Each rendition is encoded at the highest quality step within its budget,
+# starting from its "max_quality" if it has one.
+# OG and square images stay JPEG, not every social crawler accepts WebP, and
+# keep full chroma resolution for the sharp edges of the logo and poster.
+# The square canvas shrinks the poster the most, at quality 90 its JPEG
+# artefacts exceed the bounds of variant_diff.py, so it starts at 95.
+QUALITY_STEPS = (90, 85, 80, 75, 70, 60, 50, 40)
+RENDITION_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+# Box the image CDN fits posters into. The variants paste the poster fitted
+# into their canvas and the widest page rendition is max(POSTER_WIDTHS), so
+# no source pixel beyond this box is ever used (the blurred background does
+# not need them). The height leaves room for that width up to a 1:2 poster.
+MAX_POSTER_ASPECT = 2  # height / width
+POSTER_FETCH_BOX = (
+    max(OG_SIZE[0], SQUARE_SIZE, max(POSTER_WIDTHS)),
+    max(OG_SIZE[1], SQUARE_SIZE, max(POSTER_WIDTHS) * MAX_POSTER_ASPECT),
+)
+VARIANT_TEMPLATES = {
+    "og": {
+        "size": OG_SIZE,
+        "logo": {"size": 300, "position": "bottom-left", "padding": 15},
+        "renditions": [{"format": "JPEG", "budget": 250_000, "subsampling": 0}],
+    },
+    "square": {
+        "size": (SQUARE_SIZE, SQUARE_SIZE),
+        "logo": {"size": SQUARE_SIZE, "rotate": 90, "crop": (0.22, 0.78)},
+        "renditions": [
+            {"format": "JPEG", "budget": 250_000, "subsampling": 0, "max_quality": 95}
+        ],
+    },
+    "poster": {
+        "renditions": [
+            {"format": image_format, "width": width, "budget": budget}
+            for width, budget in POSTER_WIDTHS.items()
+            for image_format in ("WEBP", "JPEG")
+        ],
+    },
+}
+LOGO_PATHS = {
+    # Square variant: preview_image.png, rotated and cropped to a strip
+    "square": [
+        "public/preview_image.png",
+        "preview_image.png",
+        "../public/preview_image.png",
+    ],
+    # OG variant: preview_image_sq.png
+    "og": [
+        "public/preview_image_sq.png",
+        "preview_image_sq.png",
+        "src/assets/preview_image_sq.png",
+        "../public/preview_image_sq.png",
+    ],
+}
+# Prepared logo layers, keyed by logo asset hash and template
+LOGO_LAYER_CACHE = Path(".cache/logo-layers")
+# Posters looking like these are placeholders, all of them share one rendition
+PLACEHOLDER_IMAGES = ["public/placeholder-poster.png"]
+
+
+def sized_poster_url(poster_url, file_extension):
+    """
+    CDN URL for the poster fitted into POSTER_FETCH_BOX, or None.
 
-
-def download_posters(json_file_path, output_directory):
+    Only URLs that already carry resize parameters (kinoheld's
+    ?w=352&h=528&fm=webp&q=90&fit=fit) point at a resizing CDN.
+    """
+    base, _, query = poster_url.partition("?")
+    if "w=" not in query or "h=" not in query:
+        return None
+    params = {
+        "w": POSTER_FETCH_BOX[0],
+        "h": POSTER_FETCH_BOX[1],
+        "fm": CDN_FORMATS.get(file_extension.lower(), "jpg"),
+        "q": 90,
+        "fit": "fit",
+    }
+    return f"{base}?{urlencode(params)}"
+
+
+def download_posters(
+    json_file_path,
+    output_directory,
+    max_workers=8,
+    rate_per_host=4.0,
+    prune=True,
+    size_aware=True,
+):
     """
     Downloads movie posters from the movies-reference.json file.
 
+    Posters already on disk are revalidated against the manifest next to
+    the output directory (e.g. src/data/posters.manifest.json) and only
+    downloaded again if the server reports a change.
+
     Args:
         json_file_path (str): Path to the movies-reference.json file
         output_directory (str): Directory where posters will be saved
+        max_workers (int): Concurrent downloads
+        rate_per_host (float): Average requests per second per host
+        prune (bool): Delete posters of movies no longer in the reference file
+        size_aware (bool): Ask the image CDN for the largest size the variants
+            use instead of the original, falling back to the original
     """
     # Create output directory if it doesn't exist
     os.makedirs(output_directory, exist_ok=True)
@@ -23,72 +145,117 @@ def download_posters(json_file_path, output_directory):
 
     print(f"Found {len(movies_data)} movies to process...")
 
-    successful_downloads = 0
     failed_downloads = 0
+    jobs = []
 
     for movie_id, movie_info in movies_data.items():
-        try:
-            title = movie_info.get("title", f"movie_{movie_id}")
-            slug = movie_info.get("slug", f"movie_{movie_id}")
-            poster_url = movie_info.get("posterUrl")
-
-            if not poster_url:
-                print(f"No poster URL for {title} (slug: {slug})")
-                failed_downloads += 1
-                continue
-
-            # Remove the query parameters to get full size image
-            # The URL contains parameters like ?w=352&h=528&fm=webp&q=90&fit=crop
-            # We'll remove everything after the '?' to get the original image
-            clean_url = poster_url.split("?")[0]
-
-            # Get file extension from URL
-            parsed_url = urlparse(clean_url)
-            file_extension = os.path.splitext(parsed_url.path)[1]
-
-            # If no extension found, default to .jpg
-            if not file_extension:
-                file_extension = ".jpg"
-
-            # Create filename using slug
-            filename = f"{slug}{file_extension}"
-            file_path = os.path.join(output_directory, filename)
-
-            # Skip if file already exists
-            if os.path.exists(file_path):
-                print(f"Skipping {title} - file already exists")
-                continue
+        title = movie_info.get("title", f"movie_{movie_id}")
+        slug = movie_info.get("slug", f"movie_{movie_id}")
+        poster_url = movie_info.get("posterUrl")
 
-            print(f"Downloading poster for: {title}")
-            print(f"URL: {clean_url}")
-            print(f"Saving as: {filename}")
-
-            # Download the image
-            response = requests.get(clean_url, timeout=30)
-            response.raise_for_status()
-
-            # Save the image
-            with open(file_path, "wb") as img_file:
-                img_file.write(response.content)
-
-            print(f"✓ Successfully downloaded: {filename}")
-            successful_downloads += 1
-
-            # Be nice to the server - add a small delay
-            time.sleep(0.5)
-
-        except requests.RequestException as e:
-            print(f"✗ Failed to download poster for {title}: {e}")
+        if not poster_url:
+            print(f"No poster URL for {title} (slug: {slug})")
             failed_downloads += 1
+            continue
+
+        # Remove the query parameters to get full size image
+        # The URL contains parameters like ?w=352&h=528&fm=webp&q=90&fit=crop
+        # We'll remove everything after the '?' to get the original image
+        clean_url = poster_url.split("?")[0]
+
+        # Get file extension from URL
+        parsed_url = urlparse(clean_url)
+        file_extension = os.path.splitext(parsed_url.path)[1]
+
+        # If no extension found, default to .jpg
+        if not file_extension:
+            file_extension = ".jpg"
+
+        # Create filename using slug
+        filename = f"{slug}{file_extension}"
+        file_path = os.path.join(output_directory, filename)
+
+        sized_url = sized_poster_url(poster_url, file_extension) if size_aware else None
+        if sized_url:
+            jobs.append(
+                DownloadJob(title, slug, sized_url, file_path, fallback_url=clean_url)
+            )
+        else:
+            jobs.append(DownloadJob(title, slug, clean_url, file_path))
 
-        except Exception as e:
-            print(f"✗ Error processing {title}: {e}")
-            failed_downloads += 1
+    output_path = Path(output_directory)
+    manifest = PosterManifest(
+        output_path.with_name(f"{output_path.name}.manifest.json"), output_path
+    )
+    print(f"Fetching {len(jobs)} posters with {max_workers} workers...")
+    downloader = PosterDownloader(
+        max_workers=max_workers, rate_per_host=rate_per_host, manifest=manifest
+    )
+    with REPORT.stage("poster_download"):
+        for result in downloader.download_all(jobs):
+            if result.status in ("downloaded", "deduplicated"):
+                REPORT.record("poster_download_seconds", result.seconds)
+            filename = os.path.basename(result.job.path)
+            if result.status == "not_modified":
+                print(f"Skipping {result.job.title} - not modified")
+            elif result.status == "deduplicated":
+                print(f"✓ Linked duplicate poster: {filename}")
+            elif result.ok:
+                print(f"✓ Successfully downloaded: {filename} ({result.bytes} bytes)")
+            else:
+                print(
+                    f"✗ Failed to download poster for {result.job.title}: {result.error}"
+                )
 
+    if prune:
+        prune_posters(output_path, jobs, manifest)
+    manifest.save()
+
+    stats = downloader.stats.to_dict()
+    failed_downloads += stats["failed"]
+    for name in (
+        "requests",
+        "retries",
+        "downloaded",
+        "resumed",
+        "fallbacks",
+        "not_modified",
+        "deduplicated",
+        "failed",
+        "bytes",
+    ):
+        REPORT.count(f"poster_{name}", stats[name])
     print(f"\nDownload complete!")
-    print(f"Successful downloads: {successful_downloads}")
+    print(f"Successful downloads: {stats['downloaded'] + stats['deduplicated']}")
+    print(f"Not modified: {stats['not_modified']}")
     print(f"Failed downloads: {failed_downloads}")
     print(f"Total movies processed: {len(movies_data)}")
+    print(
+        f"Requests: {stats['requests']} ({stats['retries']} retries), "
+        f"{stats['bytes'] / 1e6:.1f} MB in {stats['seconds']:.1f}s "
+        f"({stats['files_per_second']} files/s, {stats['mb_per_second']} MB/s)"
+    )
+    return stats
+
+
+def prune_posters(output_path, jobs, manifest):
+    """Deletes poster files and manifest entries that no job refers to."""
+    current = {Path(job.path).name for job in jobs}
+    removed = 0
+    for poster_file in output_path.iterdir():
+        if (
+            poster_file.is_file()
+            and poster_file.suffix.lower() in POSTER_EXTENSIONS
+            and poster_file.name not in current
+        ):
+            poster_file.unlink()
+            removed += 1
+    slugs = {job.slug for job in jobs}
+    for slug in list(manifest.entries):
+        if slug not in slugs:
+            manifest.remove(slug)
+    if removed:
+        print(f"Removed {removed} posters no longer referenced")
 
 
 import json
@@ -101,63 +268,181 @@ from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import io
 
 
-def create_poster_variants(poster_path, slug, variants_dir):
+def create_poster_variants(
+    poster_path, slug, variants_dir, variant_types=("og", "square", "poster")
+):
     """
-    Creates social media variants of a poster image.
+    Creates social media variants and page renditions of a poster image.
 
     Args:
         poster_path (str): Path to the original poster
         slug (str): Movie slug for naming
         variants_dir (str): Directory to save variants
+        variant_types (tuple): Variants to render, keys of VARIANT_TEMPLATES
+
+    Returns:
+        dict: {variant type: [saved rendition, ...]}, or None on failure
     """
     try:
-        # Create variants directory if it doesn't exist
-        og_dir = os.path.join(variants_dir, "og")  # 1200x630
-        square_dir = os.path.join(variants_dir, "square")  # 600x600
-        os.makedirs(og_dir, exist_ok=True)
-        os.makedirs(square_dir, exist_ok=True)
-
-        # Open the original poster
-        with Image.open(poster_path) as img:
-            # Convert to RGB if necessary
-            if img.mode != "RGB":
-                img = img.convert("RGB")
-
-            # Create Open Graph variant (1200x630)
-            og_variant = create_og_variant(img, slug)
-            og_path = os.path.join(og_dir, f"{slug}.png")  # Changed to .png
-            og_variant.save(og_path, "PNG", quality=95)  # Changed to PNG format
-
-            # Create square variant (600x600)
-            square_variant = create_square_variant(img, slug)
-            square_path = os.path.join(square_dir, f"{slug}.png")  # Changed to .png
-            square_variant.save(square_path, "PNG", quality=95)  # Changed to PNG format
+        # Decode the poster once, at the scale the variants need
+        with load_poster(poster_path) as img:
+            renditions = {}
+            for variant_type in variant_types:
+                if variant_type == "og":
+                    # Create Open Graph variant (1200x630)
+                    image = create_og_variant(img, slug)
+                elif variant_type == "square":
+                    # Create square variant (600x600)
+                    image = create_square_variant(img, slug)
+                else:
+                    # The poster itself, scaled down for the pages
+                    image = img
+                renditions[variant_type] = save_renditions(
+                    image, slug, variant_type, variants_dir
+                )
 
             print(f"✓ Created variants for: {slug}")
-            return True
+            return renditions
 
     except Exception as e:
         print(f"✗ Failed to create variants for {slug}: {e}")
-        return False
+        return None
+
+
+def save_renditions(image, slug, variant_type, variants_dir):
+    """Encodes and writes the renditions of one variant, returns their entries."""
+    directory = Path(variants_dir) / variant_type
+    directory.mkdir(parents=True, exist_ok=True)
+    width, height = original_size(image)
+    saved = []
+    for rendition in VARIANT_TEMPLATES[variant_type]["renditions"]:
+        extension = RENDITION_EXTENSIONS[rendition["format"]]
+        if "width" in rendition:
+            # Never upscale, posters narrower than a width get one rendition
+            out_width = min(rendition["width"], width)
+            name = f"{slug}-{out_width}.{extension}"
+            if any(r["file"] == f"{variant_type}/{name}" for r in saved):
+                continue
+            out_height = max(1, round(height * out_width / width))
+            with REPORT.stage("variant_resize"):
+                resized = image.resize(
+                    (out_width, out_height),
+                    Image.Resampling.LANCZOS,
+                    box=source_box(image),
+                )
+        else:
+            name = f"{slug}.{extension}"
+            resized = image
+
+        with REPORT.stage("variant_encode"):
+            data, quality = encode_within_budget(
+                resized,
+                rendition["format"],
+                rendition["budget"],
+                subsampling=rendition.get("subsampling"),
+                max_quality=rendition.get("max_quality"),
+            )
+        # Replaced, not rewritten, so hardlinked duplicates keep their content
+        with REPORT.stage("variant_write"):
+            tmp = directory / f".{name}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, directory / name)
+        REPORT.count("variant_renditions")
+        REPORT.count("variant_bytes", len(data))
+        if len(data) > rendition["budget"]:
+            print(
+                f"Warning: {variant_type}/{name} is {len(data)} bytes, "
+                f"over its budget of {rendition['budget']}"
+            )
+        saved.append(
+            {
+                "file": f"{variant_type}/{name}",
+                "format": extension,
+                "width": resized.width,
+                "height": resized.height,
+                "bytes": len(data),
+                "quality": quality,
+            }
+        )
+    return saved
+
+
+def encode_image(image, image_format, quality, subsampling=None):
+    REPORT.count("variant_encodes")
+    buffer = io.BytesIO()
+    if image_format == "JPEG":
+        options = {} if subsampling is None else {"subsampling": subsampling}
+        image.save(
+            buffer,
+            "JPEG",
+            quality=quality,
+            optimize=True,
+            progressive=True,
+            **options,
+        )
+    elif image_format == "WEBP":
+        image.save(buffer, "WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, image_format, optimize=True)
+    return buffer.getvalue()
+
+
+def encode_within_budget(
+    image, image_format, budget, subsampling=None, max_quality=None
+):
+    """
+    (encoded bytes, quality) at the highest QUALITY_STEPS entry within budget.
+
+    With `max_quality` the steps start there instead. Falls back to the
+    lowest step if none fits. PNG has no quality setting and is returned as
+    is.
+    """
+    if image_format == "PNG":
+        return encode_image(image, image_format, None), None
+    steps = QUALITY_STEPS
+    if max_quality is not None:
+        steps = (max_quality, *(q for q in QUALITY_STEPS if q < max_quality))
+    data = encode_image(image, image_format, steps[0], subsampling)
+    if len(data) <= budget:
+        return data, steps[0]
+
+    # Bisect the lower steps, the size shrinks with the quality
+    best = None
+    low, high = 1, len(steps) - 1
+    while low <= high:
+        middle = (low + high) // 2
+        data = encode_image(image, image_format, steps[middle], subsampling)
+        if len(data) <= budget:
+            best, high = (data, steps[middle]), middle - 1
+        else:
+            low = middle + 1
+    if best is None:
+        best = (encode_image(image, image_format, steps[-1], subsampling), steps[-1])
+    return best
 
 
 def create_og_variant(img, slug):
     """Creates a 1200x630 Open Graph variant with blurred background padding"""
-    target_width, target_height = 1200, 630
+    target_width, target_height = OG_SIZE
 
     # Calculate scaling to fit within target dimensions (not fill)
-    scale_x = target_width / img.width
-    scale_y = target_height / img.height
+    width, height = original_size(img)
+    scale_x = target_width / width
+    scale_y = target_height / height
     scale = min(scale_x, scale_y)  # Use smaller scale to fit completely
 
-    new_width = int(img.width * scale)
-    new_height = int(img.height * scale)
+    new_width = int(width * scale)
+    new_height = int(height * scale)
 
     # Create blurred background
-    background = create_blurred_background(img, target_width, target_height)
+    with REPORT.stage("variant_background"):
+        background = create_blurred_background(img, target_width, target_height)
 
     # Resize the main image while preserving aspect ratio
-    resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    with REPORT.stage("variant_resize"):
+        resized = img.resize(
+            (new_width, new_height), Image.Resampling.LANCZOS, box=source_box(img)
+        )
 
     # Center the resized image on the blurred background
     x_offset = (target_width - new_width) // 2
@@ -165,25 +450,34 @@ def create_og_variant(img, slug):
     background.paste(resized, (x_offset, y_offset))
 
     # Add logo with drop shadow - use square logo for OG variant
-    add_logo(background, position="bottom-left", size=300, variant_type="og")
+    logo = VARIANT_TEMPLATES["og"]["logo"]
+    with REPORT.stage("variant_logo"):
+        add_logo(
+            background, position=logo["position"], size=logo["size"], variant_type="og"
+        )
 
     return background
 
 
 def create_square_variant(img, slug):
     """Creates a 600x600 square variant with blurred background padding"""
-    target_size = 600
+    target_size = SQUARE_SIZE
 
     # Calculate scaling to fit within square dimensions
-    scale = target_size / max(img.width, img.height)  # Use max to ensure it fits
-    new_width = int(img.width * scale)
-    new_height = int(img.height * scale)
+    width, height = original_size(img)
+    scale = target_size / max(width, height)  # Use max to ensure it fits
+    new_width = int(width * scale)
+    new_height = int(height * scale)
 
     # Create blurred background
-    background = create_blurred_background(img, target_size, target_size)
+    with REPORT.stage("variant_background"):
+        background = create_blurred_background(img, target_size, target_size)
 
     # Resize the main image while preserving aspect ratio
-    resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    with REPORT.stage("variant_resize"):
+        resized = img.resize(
+            (new_width, new_height), Image.Resampling.LANCZOS, box=source_box(img)
+        )
 
     # Center the resized image on the blurred background between the logo on the left and the right edge
     logo_width = int(target_size * 0.47619047619047616 * 0.56)  # Half of the logo width
@@ -192,9 +486,13 @@ def create_square_variant(img, slug):
     background.paste(resized, (x_offset, y_offset))
 
     # Add logo - use cropped and rotated preview_image.png for square variant
-    add_logo(
-        background, position="bottom-left", size=target_size, variant_type="square"
-    )
+    with REPORT.stage("variant_logo"):
+        add_logo(
+            background,
+            position="top-left",
+            size=VARIANT_TEMPLATES["square"]["logo"]["size"],
+            variant_type="square",
+        )
 
     return background
 
@@ -202,79 +500,165 @@ def create_square_variant(img, slug):
 def add_logo(canvas, position="bottom-left", size=60, variant_type="og"):
     """Adds the logo to the image - different logos for different variants"""
     try:
+        prepared = logo_layer(variant_type, size)
+        if prepared is None:
+            return
+        logo, mask = prepared
+
         if variant_type == "square":
-            # For square variant: use preview_image.png, crop to half height, rotate 90°
-            logo_paths = [
-                "public/preview_image.png",
-                "preview_image.png",
-                "../public/preview_image.png",
-            ]
+            # The square strip always covers the left edge
+            canvas.paste(logo, (0, 0), mask)
         else:
-            # For OG variant: use preview_image_sq.png as before
-            logo_paths = [
-                "public/preview_image_sq.png",
-                "preview_image_sq.png",
-                "src/assets/preview_image_sq.png",
-                "../public/preview_image_sq.png",
-            ]
-
-        logo_path = None
-        for path in logo_paths:
-            if os.path.exists(path):
-                logo_path = path
-                break
-
-        if not logo_path:
+            # Calculate position
+            padding = VARIANT_TEMPLATES["og"]["logo"]["padding"]
+            if position == "bottom-left":
+                x = padding
+                y = canvas.height - size - padding
+            elif position == "bottom-right":
+                x = canvas.width - size - padding
+                y = canvas.height - size - padding
+            elif position == "top-left":
+                x = padding
+                y = padding
+            else:  # top-right
+                x = canvas.width - size - padding
+                y = padding
+
+            # Paste the logo
+            canvas.paste(logo, (x, y), mask)  # Use logo alpha for transparency
+
+    except Exception as e:
+        print(f"Warning: Could not add logo: {e}")
+
+
+# ------------------------
+# Logo Layer Cache
+# ------------------------
+# The logo overlay is the same for every poster of a variant type, so it is
+# prepared once per process (each pool worker has its own copy) and kept in
+# LOGO_LAYER_CACHE between runs, named after the asset hash and template.
+# Layers of a replaced logo or changed template are pruned at the next run.
+
+_logo_assets = {}  # variant type -> (path, sha1) or None
+_logo_layers = {}  # (variant type, size) -> (RGBA layer, alpha mask) or None
+
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def logo_asset(variant_type):
+    """(path, sha1) of the logo file of a variant type, or None if missing."""
+    if variant_type not in _logo_assets:
+        path = next((p for p in LOGO_PATHS[variant_type] if os.path.exists(p)), None)
+        if path is None:
             print(f"Warning: Could not find logo file for {variant_type} variant")
-            return
+        _logo_assets[variant_type] = path and (path, file_sha1(path))
+    return _logo_assets[variant_type]
+
+
+def logo_layer(variant_type, size):
+    """The prepared (layer, mask) of a variant type, or None without a logo."""
+    key = (variant_type, size)
+    if key not in _logo_layers:
+        asset = logo_asset(variant_type)
+        layer = None
+        if asset is not None:
+            path, sha1 = asset
+            name = f"{variant_type}-{size}-{sha1[:16]}-{template_fingerprint(variant_type)}.png"
+            layer = (
+                load_logo_layer(LOGO_LAYER_CACHE / name) if LOGO_LAYER_CACHE else None
+            )
+            if layer is None:
+                layer = prepare_logo_layer(path, variant_type, size)
+                if LOGO_LAYER_CACHE:
+                    save_logo_layer(layer, LOGO_LAYER_CACHE / name)
+        _logo_layers[key] = layer and (layer, layer.getchannel("A"))
+    return _logo_layers[key]
+
+
+def prune_logo_layers(shared_inputs):
+    """
+    Deletes cached logo layers whose logo file or template fingerprint is
+    not the current one of their variant type (see logo_layer for the name).
+    """
+    if not LOGO_LAYER_CACHE or not LOGO_LAYER_CACHE.is_dir():
+        return
+    current = {
+        variant_type: f"-{inputs['logo'][:16]}-{inputs['template']}.png"
+        for variant_type, inputs in shared_inputs.items()
+        if inputs["logo"]
+    }
+    for path in LOGO_LAYER_CACHE.iterdir():
+        if path.name.startswith("."):  # being written by another process
+            continue
+        suffix = current.get(path.name.partition("-")[0])
+        if suffix is None or not path.name.endswith(suffix):
+            try:
+                path.unlink()
+            except OSError as e:
+                print(f"Warning: Could not delete stale logo layer {path.name}: {e}")
+
+
+def prepare_logo_layer(logo_path, variant_type, size):
+    with Image.open(logo_path) as logo:
+        # Convert to RGBA to handle transparency
+        if logo.mode != "RGBA":
+            logo = logo.convert("RGBA")
 
-        # Open and process the logo
-        with Image.open(logo_path) as logo:
-            # Convert to RGBA to handle transparency
-            if logo.mode != "RGBA":
-                logo = logo.convert("RGBA")
+        if variant_type == "square":
+            template = VARIANT_TEMPLATES["square"]["logo"]
+            # Rotate 90 degrees clockwise
+            logo = logo.rotate(template["rotate"], expand=True)
 
-            if variant_type == "square":
-                # Rotate 90 degrees clockwise
-                logo = logo.rotate(90, expand=True)
+            logo = logo.resize(
+                (int(size * 0.47619047619047616), size), Image.Resampling.LANCZOS
+            )
 
-                # Crop to half height (top half)
+            # Crop to the middle of the width
+            low, high = template["crop"]
+            left = int(logo.width * low)
+            right = int(logo.width * high)
+            return logo.crop((left, 0, right, logo.height))
 
-                logo = logo.resize(
-                    (int(size * 0.47619047619047616), size), Image.Resampling.LANCZOS
-                )
+        # Resize the logo
+        return logo.resize((size, size), Image.Resampling.LANCZOS)
 
-                # Crop to the middle 20% of the width
-                left = int(logo.width * 0.22)
-                right = int(logo.width * 0.78)
-                logo = logo.crop((left, 0, right, logo.height))
 
-                canvas.paste(logo, (0, 0), logo)
+def load_logo_layer(path):
+    try:
+        with Image.open(path) as layer:
+            layer.load()
+            return layer if layer.mode == "RGBA" else None
+    except OSError:
+        return None
 
-            else:
-                # Resize the logo
-                logo = logo.resize((size, size), Image.Resampling.LANCZOS)
-
-                # Calculate position
-                padding = 15
-                if position == "bottom-left":
-                    x = padding
-                    y = canvas.height - size - padding
-                elif position == "bottom-right":
-                    x = canvas.width - size - padding
-                    y = canvas.height - size - padding
-                elif position == "top-left":
-                    x = padding
-                    y = padding
-                else:  # top-right
-                    x = canvas.width - size - padding
-                    y = padding
-
-                # Paste the logo
-                canvas.paste(logo, (x, y), logo)  # Use logo as mask for transparency
 
-    except Exception as e:
-        print(f"Warning: Could not add logo: {e}")
+def save_logo_layer(layer, path):
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        layer.save(tmp, "PNG")
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Warning: Could not cache logo layer: {e}")
+
+
+def template_fingerprint(variant_type):
+    """Changes whenever the render template of a variant type changes."""
+    template = {
+        "version": VARIANT_TEMPLATE_VERSION,
+        "blur_radius": BLUR_RADIUS,
+        "brightness": BACKGROUND_BRIGHTNESS,
+        "backdrop_scale": BACKDROP_SCALE,
+        **VARIANT_TEMPLATES[variant_type],
+    }
+    encoded = json.dumps(template, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:16]
 
 
 def add_branding(canvas, text, position="bottom-right", size="small"):
@@ -319,49 +703,226 @@ def add_branding(canvas, text, position="bottom-right", size="small"):
 
 def create_blurred_background(img, target_width, target_height):
     """Creates a blurred, scaled version of the image to use as background"""
-    from PIL import ImageFilter
-
-    # Calculate how to scale the image to fill the entire target area
-    img_ratio = img.width / img.height
+    # Center crop of the image with the target aspect ratio, so that scaling
+    # it fills the entire target area
+    _, _, img_width, img_height = source_box(img)
+    img_ratio = img_width / img_height
     target_ratio = target_width / target_height
 
     if img_ratio > target_ratio:
-        # Image is wider - scale by height to fill
-        scale = target_height / img.height
-        new_width = int(img.width * scale)
-        new_height = target_height
+        # Image is wider - crop the sides
+        crop_width = img_height * target_ratio
+        left = (img_width - crop_width) / 2
+        box = (left, 0, left + crop_width, img_height)
     else:
-        # Image is taller - scale by width to fill
-        scale = target_width / img.width
-        new_width = target_width
-        new_height = int(img.height * scale)
+        # Image is taller - crop top and bottom
+        crop_height = img_width / target_ratio
+        top = (img_height - crop_height) / 2
+        box = (0, top, img_width, top + crop_height)
+
+    # Blur a small version, the radius shrinks with it
+    small_size = (
+        max(1, round(target_width / BACKDROP_SCALE)),
+        max(1, round(target_height / BACKDROP_SCALE)),
+    )
+    background = img.resize(small_size, Image.Resampling.LANCZOS, box=box)
+    background = background.filter(
+        ImageFilter.GaussianBlur(radius=BLUR_RADIUS / BACKDROP_SCALE)
+    )
 
-    # Resize to fill the background
-    background = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+    # Darken the background to make the main image pop, as one lookup table
+    background = background.point(
+        [round(v * BACKGROUND_BRIGHTNESS) for v in range(256)] * len(background.mode)
+    )
 
-    # If the background is larger than target, crop from center
-    if new_width > target_width or new_height > target_height:
-        left = (new_width - target_width) // 2
-        top = (new_height - target_height) // 2
-        right = left + target_width
-        bottom = top + target_height
-        background = background.crop((left, top, right, bottom))
+    return background.resize((target_width, target_height), Image.Resampling.BICUBIC)
 
-    # Apply blur effect
-    background = background.filter(ImageFilter.GaussianBlur(radius=15))
 
-    # Darken the background slightly to make the main image pop
-    from PIL import ImageEnhance
+def load_poster(poster_path):
+    """
+    Decodes a poster as RGB, shrunk to the smallest size the variants use.
 
-    enhancer = ImageEnhance.Brightness(background)
-    background = enhancer.enhance(0.3)  # Make it 30% as bright (70% darker)
+    JPEGs are decoded at a reduced DCT scale with draft(), other formats are
+    shrunk by an integer factor with reduce(). Both stay at or above the
+    size needed, the final resizes still use LANCZOS.
+    """
+    with REPORT.stage("poster_decode"), Image.open(poster_path) as img:
+        width, height = img.size
+        scale = min(1.0, variant_source_scale(width, height))
+        needed = (max(1, int(width * scale)), max(1, int(height * scale)))
+        if img.format == "JPEG":
+            img.draft("RGB", needed)
+        img = img.convert("RGB")
+    # DCT scaling divides by a power of two
+    shrink = 2 ** round(math.log2(width / img.width))
+    factor = min(img.width // needed[0], img.height // needed[1])
+    if factor > 1:
+        with REPORT.stage("poster_reduce"):
+            img = img.reduce(factor)
+        shrink *= factor
+
+    # Both round partial edge pixels up, so the shrunk image covers slightly
+    # more than the poster. The layout uses the original size and resizes
+    # read the exact box, so the output does not shift or stretch.
+    img.info["original_size"] = (width, height)
+    img.info["source_box"] = (0, 0, width / shrink, height / shrink)
+    return img
+
+
+def original_size(img):
+    return img.info.get("original_size", img.size)
+
+
+def source_box(img):
+    """Region of `img` that holds the poster, see load_poster."""
+    return img.info.get("source_box", (0, 0, img.width, img.height))
+
+
+def variant_source_scale(width, height):
+    """Largest scale of a width x height poster that any variant draws at."""
+    og_width, og_height = OG_SIZE
+    return max(
+        # Sharp poster fitted into the canvases
+        min(og_width / width, og_height / height),
+        SQUARE_SIZE / max(width, height),
+        # Backgrounds filling the canvases, at backdrop resolution
+        max(og_width / width, og_height / height) / BACKDROP_SCALE,
+        SQUARE_SIZE / min(width, height) / BACKDROP_SCALE,
+        # Largest page rendition
+        max(POSTER_WIDTHS) / width,
+    )
 
-    return background
 
+class VariantManifest:
+    """
+    Inputs and files of each rendered variant, by slug.
 
-def process_all_posters_for_variants(posters_dir, variants_dir):
+    {slug: {variant type: {"source", "logo", "template", "files"}}} with the
+    sha1 of the poster and of the logo file, the template fingerprint and
+    the saved renditions. A variant whose inputs are unchanged and whose
+    files all exist is not rendered again.
     """
-    Process all posters in the directory and create social media variants.
+
+    def __init__(self, path, directory):
+        self.path = Path(path)
+        self.directory = Path(directory)
+        self.entries = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                print(f"Warning: Ignoring unreadable variant manifest: {e}")
+
+    def is_current(self, slug, variant_type, inputs):
+        entry = self.entries.get(slug, {}).get(variant_type)
+        return (
+            entry is not None
+            and all(entry.get(key) == value for key, value in inputs.items())
+            and bool(entry.get("files"))
+            and all((self.directory / f["file"]).exists() for f in entry["files"])
+        )
+
+    def update(self, slug, variant_type, inputs, files):
+        self.entries.setdefault(slug, {})[variant_type] = {**inputs, "files": files}
+
+    def invalidate(self, slug, variant_type):
+        """Renders the variant again next time, but keeps its files for now."""
+        entry = self.entries.get(slug, {}).get(variant_type)
+        if entry is not None:
+            entry["source"] = None
+
+    def remove(self, slug):
+        self.entries.pop(slug, None)
+
+    def files(self):
+        return {
+            f["file"]
+            for variants in self.entries.values()
+            for entry in variants.values()
+            for f in entry.get("files", [])
+        }
+
+    def renditions(self, url_prefix):
+        """{slug: {variant type: [{"url", "format", "width", ...}]}} for srcset."""
+        return {
+            slug: {
+                variant_type: sorted(
+                    (
+                        {
+                            "url": f"{url_prefix}/{f['file']}",
+                            "format": f["format"],
+                            "width": f["width"],
+                            "height": f["height"],
+                            "bytes": f["bytes"],
+                        }
+                        for f in entry.get("files", [])
+                    ),
+                    key=lambda r: (r["format"], r["width"]),
+                )
+                for variant_type, entry in sorted(variants.items())
+            }
+            for slug, variants in sorted(self.entries.items())
+        }
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(
+            json.dumps(self.entries, indent=2, sort_keys=True, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+
+def render_variants_timed(task, variants_dir):
+    """
+    Process pool task: renders one poster's variants.
+
+    Returns (renditions, seconds, metrics), metrics being the REPORT stage
+    times and counters of this render (see RunReport.since).
+    """
+    poster_file, variant_types = task
+    before = REPORT.snapshot()
+    start = time.perf_counter()
+    renditions = create_poster_variants(
+        poster_file, poster_file.stem, variants_dir, variant_types
+    )
+    return renditions, time.perf_counter() - start, REPORT.since(before)
+
+
+def process_all_posters_for_variants(
+    posters_dir,
+    variants_dir,
+    workers=None,
+    force=False,
+    renditions_path=None,
+    url_prefix="/poster-variants",
+    manifest_path=None,
+    hashes_path=None,
+):
+    """
+    Process all posters in the directory and create social media variants
+    and page renditions.
+
+    Only variants whose poster, logo or render template changed since the
+    last run are rendered (all of them with `force`); the inputs are kept in
+    `manifest_path` (default: <posters_dir>.variants.json, next to the
+    posters rather than among the deployed variants). Files of posters that
+    no longer exist, or that the current renditions do not produce, are
+    deleted, and so are cached logo layers of an older logo or template.
+
+    Posters that look like another one (perceptual hash, see
+    poster_hashes.py) or like a placeholder are rendered once, the other
+    slugs get hardlinks to those files. The hashes are cached in
+    `hashes_path` (default: <posters_dir>.hashes.json).
+
+    Posters are rendered in a process pool with `workers` processes (default:
+    one per available core, 1 renders in this process). At most two tasks
+    per worker are in flight, so only that many decoded posters are held in
+    memory at a time.
+
+    With `renditions_path`, the URLs, formats, sizes and byte counts of all
+    renditions are written there as JSON for srcset.
     """
     posters_path = Path(posters_dir)
     variants_path = Path(variants_dir)
@@ -371,32 +932,216 @@ def process_all_posters_for_variants(posters_dir, variants_dir):
         return
 
     # Get all image files
-    image_extensions = {".jpg", ".jpeg", ".png", ".webp"}
     poster_files = [
         f
         for f in posters_path.iterdir()
-        if f.is_file() and f.suffix.lower() in image_extensions
+        if f.is_file() and f.suffix.lower() in POSTER_EXTENSIONS
     ]
 
-    print(f"Found {len(poster_files)} poster files to process...")
+    if manifest_path is None:
+        manifest_path = posters_path.with_name(f"{posters_path.name}.variants.json")
+    manifest = VariantManifest(manifest_path, variants_path)
+    shared_inputs = {}
+    for variant_type, template in VARIANT_TEMPLATES.items():
+        asset = logo_asset(variant_type) if "logo" in template else None
+        shared_inputs[variant_type] = {
+            "logo": asset and asset[1],
+            "template": template_fingerprint(variant_type),
+        }
+    prune_logo_layers(shared_inputs)
+
+    if hashes_path is None:
+        hashes_path = posters_path.with_name(f"{posters_path.name}.hashes.json")
+    hashes = PosterHashes(hashes_path)
+    # filename without extension -> (file, content hash)
+    sources = {f.stem: (f, file_sha1(f)) for f in poster_files}
+    canonical, placeholders = hashes.group(sources, PLACEHOLDER_IMAGES)
+    hashes.save()
+
+    tasks = []
+    task_inputs = {}
+    stale_duplicates = []
+    for poster_file in poster_files:
+        slug = poster_file.stem
+        original = canonical[slug]
+        stale = []
+        for variant_type in VARIANT_TEMPLATES:
+            inputs = {
+                "source": sources[original][1],
+                "duplicate_of": None if original == slug else original,
+                **shared_inputs[variant_type],
+            }
+            if force or not manifest.is_current(slug, variant_type, inputs):
+                stale.append(variant_type)
+                task_inputs[slug, variant_type] = inputs
+        if not stale:
+            continue
+        if original == slug:
+            tasks.append((poster_file, tuple(stale)))
+        else:
+            stale_duplicates.append((slug, tuple(stale)))
+
+    workers = workers or available_cores()
+    duplicates = sum(slug != original for slug, original in canonical.items())
+    print(
+        f"Found {len(poster_files)} poster files ({duplicates} duplicates, "
+        f"{len(placeholders)} placeholders), {len(tasks)} to render "
+        f"with {workers} workers..."
+    )
 
     successful_variants = 0
     failed_variants = 0
+    timings = {}
+    start = time.perf_counter()
 
-    for poster_file in poster_files:
-        slug = poster_file.stem  # filename without extension
-
-        if create_poster_variants(poster_file, slug, variants_path):
+    pooled = workers > 1 and len(tasks) > 1
+    if pooled:
+        results = bounded_map(render_variants_timed, tasks, variants_path, workers)
+    else:
+        results = ((task, render_variants_timed(task, variants_path)) for task in tasks)
+    for (poster_file, variant_types), (renditions, seconds, metrics) in results:
+        slug = poster_file.stem
+        timings[slug] = seconds
+        REPORT.record("variant_render_seconds", seconds)
+        if pooled:
+            # Rendered in a worker process, whose REPORT is its own
+            REPORT.merge(metrics)
+        for variant_type in variant_types:
+            if renditions is not None:
+                manifest.update(
+                    slug,
+                    variant_type,
+                    task_inputs[slug, variant_type],
+                    renditions[variant_type],
+                )
+            else:
+                manifest.invalidate(slug, variant_type)
+        if renditions is not None:
             successful_variants += 1
         else:
             failed_variants += 1
 
-        # Small delay to avoid overwhelming the system
-        time.sleep(0.1)
+    # Duplicates link to the files of their canonical poster, once rendered
+    linked = 0
+    for slug, variant_types in stale_duplicates:
+        original = canonical[slug]
+        for variant_type in variant_types:
+            entry = manifest.entries.get(original, {}).get(variant_type)
+            if entry is None or entry.get("source") is None:
+                manifest.invalidate(slug, variant_type)
+                continue
+            files = link_renditions(variants_path, entry["files"], original, slug)
+            manifest.update(slug, variant_type, task_inputs[slug, variant_type], files)
+        linked += 1
+
+    removed = prune_variants(variants_path, set(sources), manifest)
+    manifest.save()
+    if renditions_path:
+        Path(renditions_path).write_text(
+            json.dumps(manifest.renditions(url_prefix), indent=2, ensure_ascii=False),
+            encoding="utf-8",
+        )
 
+    REPORT.count("variant_posters_rendered", successful_variants)
+    REPORT.count("variant_posters_failed", failed_variants)
+    REPORT.count("variant_posters_linked", linked)
+    REPORT.count(
+        "variant_posters_current",
+        len(poster_files) - len(tasks) - len(stale_duplicates),
+    )
     print(f"\nVariant creation complete!")
     print(f"Successful: {successful_variants}")
     print(f"Failed: {failed_variants}")
+    print(f"Linked duplicates: {linked}")
+    print(f"Up to date: {len(poster_files) - len(tasks) - len(stale_duplicates)}")
+    if removed:
+        print(f"Removed {removed} variant files no longer produced")
+    output_bytes = {}
+    for variants in manifest.entries.values():
+        for variant_type, entry in variants.items():
+            for f in entry.get("files", []):
+                key = f"{variant_type} {f['format']}"
+                output_bytes[key] = output_bytes.get(key, 0) + f["bytes"]
+    print(
+        "Output: "
+        + ", ".join(
+            f"{key} {n / 1e6:.1f} MB" for key, n in sorted(output_bytes.items())
+        )
+    )
+    if timings:
+        stats = summarize(list(timings.values()))
+        slowest = sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:3]
+        print(
+            f"Rendered in {time.perf_counter() - start:.1f}s, per poster "
+            f"p50 {stats['p50']:.2f}s, p90 {stats['p90']:.2f}s, max {stats['max']:.2f}s "
+            f"(slowest: {', '.join(f'{slug} {t:.2f}s' for slug, t in slowest)})"
+        )
+    return timings
+
+
+def link_renditions(variants_path, files, original, slug):
+    """Hardlinks (or copies) the rendition files of `original` for `slug`."""
+    linked = []
+    for f in files:
+        directory, _, name = f["file"].partition("/")
+        target = f"{directory}/{slug}{name[len(original):]}"
+        tmp = variants_path / directory / f".{slug}{name[len(original):]}.tmp"
+        if tmp.exists():
+            tmp.unlink()
+        try:
+            os.link(variants_path / f["file"], tmp)
+        except OSError:
+            shutil.copyfile(variants_path / f["file"], tmp)
+        os.replace(tmp, variants_path / target)
+        linked.append({**f, "file": target})
+    return linked
+
+
+def prune_variants(variants_path, slugs, manifest):
+    """
+    Drops manifest entries of slugs without a poster, then deletes every
+    variant file the manifest does not list. Returns the number of files.
+    """
+    for slug in list(manifest.entries):
+        if slug not in slugs:
+            manifest.remove(slug)
+    keep = manifest.files()
+    removed = 0
+    for variant_type in VARIANT_TEMPLATES:
+        variant_dir = variants_path / variant_type
+        if not variant_dir.is_dir():
+            continue
+        for variant_file in variant_dir.iterdir():
+            if (
+                variant_file.is_file()
+                and f"{variant_type}/{variant_file.name}" not in keep
+            ):
+                variant_file.unlink()
+                removed += 1
+    return removed
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS and Windows
+        return os.cpu_count() or 1
+
+
+def bounded_map(fn, items, extra_arg, workers, in_flight_per_worker=2):
+    """Yields (item, fn(item, extra_arg)) from a process pool, in completion order."""
+    items = iter(items)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for item in itertools.islice(items, workers * in_flight_per_worker):
+            pending[pool.submit(fn, item, extra_arg)] = item
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                for next_item in itertools.islice(items, 1):
+                    pending[pool.submit(fn, next_item, extra_arg)] = next_item
+                yield item, future.result()
 
 
 if __name__ == "__main__":
@@ -411,4 +1156,13 @@ if __name__ == "__main__":
 
     # Step 2: Create social media variants
     print("\n=== CREATING POSTER VARIANTS ===")
-    process_all_posters_for_variants(posters_directory, variants_directory)
+    process_all_posters_for_variants(
+        posters_directory,
+        variants_directory,
+        renditions_path=Path("src/data/posterRenditions.json"),
+    )
+
+    # Stage times and counters, to compare weekly runs
+    report_path = posters_directory.with_name(f"{posters_directory.name}.run.json")
+    REPORT.write(report_path)
+    print(f"Saved run report to {report_path.as_posix()}")
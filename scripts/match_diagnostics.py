@@ -0,0 +1,148 @@
+import argparse
+import csv
+import json
+from pathlib import Path
+
+from embedders import BACKENDS, MODEL_NAME, HashedNgramEmbedder, create_embedder
+from matcher import WEIGHTS, TitleIndex, metric_diagnostics, normalize_title
+
+# ------------------------
+# Match Diagnostics
+# ------------------------
+# Top-k candidates per similarity component and for the weighted composite,
+# for every schedule of a week, as JSON or CSV (chosen by the file suffix):
+#
+#   python scripts/match_diagnostics.py --step posters --output posters.csv
+#   python scripts/match_diagnostics.py --weights containment=0.5,prefix=0.1
+#
+# CSV has one row per (title, metric, rank); the composite rows also carry
+# the margin of the best candidate over the runner-up.
+
+DATA_DIR = Path("src/data")
+STEPS = {
+    "attributes": "movieAttributes.json",
+    "posters": "moviePosterUrls.json",
+}
+
+
+def parse_weights(text):
+    """'containment=0.5,prefix=0.1' -> WEIGHTS with those entries replaced."""
+    weights = dict(WEIGHTS)
+    for item in filter(None, (text or "").split(",")):
+        metric, _, value = item.partition("=")
+        if metric not in WEIGHTS:
+            raise ValueError(f"Unknown metric in --weights: {metric}")
+        weights[metric] = float(value)
+    return weights
+
+
+def write_json(diagnostics, path, meta):
+    rounded = [
+        {
+            **row,
+            "score": round(row["score"], 4),
+            "margin": None if row["margin"] is None else round(row["margin"], 4),
+            "top": {
+                metric: [[candidate, round(score, 4)] for candidate, score in top]
+                for metric, top in row["top"].items()
+            },
+        }
+        for row in diagnostics
+    ]
+    Path(path).write_text(
+        json.dumps({**meta, "titles": rounded}, indent=2, ensure_ascii=False),
+        encoding="utf-8",
+    )
+
+
+def write_csv(diagnostics, path):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["title", "metric", "rank", "candidate", "score", "margin"])
+        for row in diagnostics:
+            for metric, top in row["top"].items():
+                for rank, (candidate, score) in enumerate(top, start=1):
+                    margin = (
+                        row["margin"] if metric == "composite" and rank == 1 else None
+                    )
+                    writer.writerow(
+                        [
+                            row["title"],
+                            metric,
+                            rank,
+                            candidate,
+                            round(score, 4),
+                            "" if margin is None else round(margin, 4),
+                        ]
+                    )
+
+
+# ------------------------
+# Main Execution
+# ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Per-metric match diagnostics for a week's programme."
+    )
+    parser.add_argument("--step", choices=STEPS, default="attributes")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument(
+        "--weights", help="Composite weights to try, e.g. containment=0.5"
+    )
+    parser.add_argument(
+        "--embedder",
+        choices=BACKENDS,
+        default="sentence-transformers",
+        help="Title embedding backend",
+    )
+    parser.add_argument("--model", default=MODEL_NAME, help="SentenceTransformer model")
+    parser.add_argument(
+        "--cache-dir",
+        default=".cache/embeddings",
+        help="Directory of the persistent embedding cache",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always embed titles with the model"
+    )
+    parser.add_argument(
+        "--output",
+        help="Write .json or .csv here (default src/data/match_diagnostics.json)",
+    )
+    args = parser.parse_args()
+
+    schedules = json.loads(
+        (DATA_DIR / "movieSchedules.json").read_text(encoding="utf-8")
+    )
+    candidates = json.loads((DATA_DIR / STEPS[args.step]).read_text(encoding="utf-8"))
+    model = create_embedder(
+        args.embedder, args.model, None if args.no_cache else args.cache_dir
+    )
+    if isinstance(model, HashedNgramEmbedder):
+        model.fit(normalize_title(r["title"]) for r in schedules + candidates)
+
+    weights = parse_weights(args.weights)
+    diagnostics = metric_diagnostics(
+        TitleIndex(schedules, model),
+        TitleIndex(candidates, model),
+        model,
+        args.threshold,
+        top_k=args.top_k,
+        weights=weights,
+    )
+
+    output = Path(args.output or DATA_DIR / "match_diagnostics.json")
+    if output.suffix == ".csv":
+        write_csv(diagnostics, output)
+    else:
+        meta = {"step": args.step, "threshold": args.threshold, "weights": weights}
+        write_json(diagnostics, output, meta)
+    matched = sum(row["match"] is not None for row in diagnostics)
+    print(
+        f"Saved diagnostics for {len(diagnostics)} titles ({matched} matched) "
+        f"to {output.as_posix()}"
+    )
+
+    cache = getattr(model, "cache", None)
+    if cache is not None:
+        cache.save()
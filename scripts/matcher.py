@@ -1,8 +1,27 @@
+import argparse
+import cProfile
+import hashlib
+import itertools
 import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+import numpy as np
 from rapidfuzz import fuzz
 from rapidfuzz import process as rf_process
-from sentence_transformers import SentenceTransformer, util
+
+from ann_index import IVFIndex
+from embedders import BACKENDS, MODEL_NAME, HashedNgramEmbedder, create_embedder
+from run_report import REPORT
+
+# Per-title progress lines; --quiet turns them off for large inputs
+VERBOSE = True
+
+
+def log(message):
+    if VERBOSE:
+        print(message)
+
 
 # ------------------------
 # Preprocessing
@@ -33,6 +52,10 @@ def tokenize_title(title: str):
 # ------------------------
 # Similarity Components
 # ------------------------
+def _as_set(tokens):
+    return tokens if isinstance(tokens, frozenset) else set(tokens)
+
+
 def string_similarity(t1, t2) -> float:
     """Character-based similarity (normalized Levenshtein)."""
     return fuzz.token_sort_ratio(t1, t2) / 100.0
@@ -40,7 +63,7 @@ def string_similarity(t1, t2) -> float:
 
 def token_similarity(tokens1, tokens2) -> float:
     """Simple Jaccard overlap on tokens."""
-    set1, set2 = set(tokens1), set(tokens2)
+    set1, set2 = _as_set(tokens1), _as_set(tokens2)
     if not set1 or not set2:
         return 0.0
     return len(set1 & set2) / len(set1 | set2)
@@ -48,7 +71,7 @@ def token_similarity(tokens1, tokens2) -> float:
 
 def containment_similarity(tokens1, tokens2) -> float:
     """Returns 1.0 if smaller set is fully contained in larger set."""
-    set1, set2 = set(tokens1), set(tokens2)
+    set1, set2 = _as_set(tokens1), _as_set(tokens2)
     if not set1 or not set2:
         return 0.0
 
@@ -57,9 +80,9 @@ def containment_similarity(tokens1, tokens2) -> float:
 
 
 def embedding_similarity(t1, t2, model) -> float:
-    """Cosine similarity on sentence embeddings."""
-    emb1, emb2 = model.encode([t1, t2], convert_to_tensor=True)
-    return float(util.cos_sim(emb1, emb2))
+    """Cosine similarity on title embeddings from any Embedder."""
+    emb1, emb2 = model.encode_batch([t1, t2])
+    return float(emb1 @ emb2)
 
 
 def prefix_boost(t1, t2) -> float:
@@ -68,9 +91,184 @@ def prefix_boost(t1, t2) -> float:
     return 1.0 if first1 == first2 else 0.0
 
 
+# ------------------------
+# Title Index
+# ------------------------
+class TitleIndex:
+    """
+    Normalized, tokenized and embedded view of a list of titled records.
+
+    Built once per list so scorers only read precomputed fields. Embeddings
+    are computed on first access, records are looked up by title in O(1).
+    """
+
+    def __init__(self, records, model=None, key="title"):
+        self.records = list(records)
+        self.titles = [r[key] for r in self.records]
+        with REPORT.stage("normalize"):
+            self.norms = [normalize_title(t) for t in self.titles]
+            self.tokens = [tuple(tokenize_title(n)) for n in self.norms]
+            self.token_sets = [frozenset(t) for t in self.tokens]
+        REPORT.count("titles_normalized", len(self.titles))
+        self.first_tokens = [t[0] if t else None for t in self.tokens]
+        self.sizes = np.array([len(s) for s in self.token_sets], dtype=float)
+        self.model = model
+
+        self.by_title = {}
+        for record, title in zip(self.records, self.titles):
+            self.by_title.setdefault(title, record)
+
+        self.first_vocab = {}
+        self.first_ids = np.array(
+            [
+                (
+                    self.first_vocab.setdefault(f, len(self.first_vocab))
+                    if f is not None
+                    else -3
+                )
+                for f in self.first_tokens
+            ]
+        )
+        self._postings = None
+        self._embeddings = None
+        self._blocker = None
+        # Optional IVFIndex over the embeddings, used by the blocker
+        self.ann = None
+
+    @classmethod
+    def from_titles(cls, titles, model=None):
+        return cls([{"title": t} for t in titles], model)
+
+    def __len__(self):
+        return len(self.titles)
+
+    def record(self, title):
+        """First record with this exact title."""
+        return self.by_title[title]
+
+    @property
+    def postings(self):
+        """Token -> array of row indices containing it."""
+        if self._postings is None:
+            postings = {}
+            for idx, tokens in enumerate(self.token_sets):
+                for token in tokens:
+                    postings.setdefault(token, []).append(idx)
+            self._postings = {t: np.array(ids) for t, ids in postings.items()}
+        return self._postings
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with REPORT.stage("embed"):
+                self._embeddings = self.model.encode_batch(self.norms)
+        return self._embeddings
+
+    @property
+    def blocker(self):
+        """CandidateBlocker over this index, built once and then reused."""
+        if self._blocker is None:
+            self._blocker = CandidateBlocker(self, ann=self.ann)
+        return self._blocker
+
+    def embed_rows(self, rows):
+        """Embeddings for a subset of rows, without embedding the whole index."""
+        if self._embeddings is not None:
+            return self._embeddings[rows]
+        with REPORT.stage("embed"):
+            return self.model.encode_batch([self.norms[i] for i in rows])
+
+
+def as_title_index(titles, model):
+    """Wraps a plain list of titles in a TitleIndex, passes an index through."""
+    if isinstance(titles, TitleIndex):
+        return titles
+    return TitleIndex.from_titles(titles, model)
+
+
+def as_record_index(records, model):
+    """Like as_title_index, for a list of titled records."""
+    if isinstance(records, TitleIndex):
+        return records
+    return TitleIndex(records, model)
+
+
 # ------------------------
 # Composite Scoring
 # ------------------------
+WEIGHTS = {
+    "string": 0.1,
+    "token": 0.1,
+    "containment": 0.4,
+    "embedding": 0.2,
+    "prefix": 0.2,
+}
+
+# Lead over the runner-up that no embedding term can close, see needs_embedding
+CASCADE_MARGIN = 2 * WEIGHTS["embedding"]
+
+
+def combine_scores(components, weights=None):
+    """
+    Weighted sum of the five components (floats or matrices).
+
+    A missing "embedding" component counts as 0, which gives the lexical
+    score used by the cascade. `weights` defaults to WEIGHTS.
+    """
+    weights = weights or WEIGHTS
+    return (
+        weights["string"] * components["string"]
+        + weights["token"] * components["token"]
+        + weights["containment"] * components["containment"]
+        + weights["embedding"] * components.get("embedding", 0.0)
+        + weights["prefix"] * components["prefix"]
+    )
+
+
+def pair_components(query, i, candidates, j, embedding=True):
+    """All similarity components for query row i vs. candidate row j."""
+    first = query.first_tokens[i]
+    components = {
+        "string": string_similarity(query.norms[i], candidates.norms[j]),
+        "token": token_similarity(query.token_sets[i], candidates.token_sets[j]),
+        "containment": containment_similarity(
+            query.token_sets[i], candidates.token_sets[j]
+        ),
+        "prefix": float(first is not None and first == candidates.first_tokens[j]),
+    }
+    if embedding:
+        components["embedding"] = float(query.embeddings[i] @ candidates.embeddings[j])
+    return components
+
+
+def needs_embedding(lexical, threshold, margin=CASCADE_MARGIN):
+    """
+    Rows of a lexical score matrix whose outcome the embedding could change.
+
+    Cosine similarity lies in [-1, 1], so the embedding term moves a score by
+    at most WEIGHTS["embedding"] either way. A row is decided lexically when
+    its winner clears the threshold by that much, or could not reach it even
+    with the full term, and leads the runner-up by at least `margin`. The
+    default of twice the weight is exact: no embedding can swap the two. A
+    smaller margin is a heuristic that embeds fewer titles and may keep a
+    winner that exhaustive scoring would not.
+    """
+    if lexical.shape[1] > 1:
+        top_two = np.partition(lexical, -2, axis=1)[:, -2:]
+        best, second = top_two[:, 1], top_two[:, 0]
+    else:
+        best, second = lexical[:, 0], np.full(len(lexical), -np.inf)
+    return needs_embedding_top(best, second, threshold, margin)
+
+
+def needs_embedding_top(best, second, threshold, margin=CASCADE_MARGIN):
+    """needs_embedding from each row's best and runner-up lexical score."""
+    weight = WEIGHTS["embedding"]
+    unreachable = best + weight < threshold
+    accepted = (best - weight >= threshold) & (best - second >= margin)
+    return ~(unreachable | accepted)
+
+
 def compute_match_score(title1, title2, model):
     norm1, norm2 = normalize_title(title1), normalize_title(title2)
     tokens1, tokens2 = tokenize_title(norm1), tokenize_title(norm2)
@@ -93,9 +291,12 @@ def compute_match_score(title1, title2, model):
 
 
 def find_best_match(title, list2, model, threshold):
+    query = TitleIndex.from_titles([title], model)
+    candidates = as_title_index(list2, model)
+
     best_score, best_title = 0, None
-    for candidate in list2:
-        score = compute_match_score(title, candidate, model)
+    for j, candidate in enumerate(candidates.titles):
+        score = combine_scores(pair_components(query, 0, candidates, j))
         if score > best_score:
             best_score, best_title = score, candidate
 
@@ -106,63 +307,874 @@ def find_best_match(title, list2, model, threshold):
 
 
 def find_best_match_per_similarity_metric(title, list2, model, threshold):
-    best_scores = {
-        "string": 0,
-        "token": 0,
-        "containment": 0,
-        "embedding": 0,
-        "prefix": 0,
-    }
-    best_titles = {
-        "string": None,
-        "token": None,
-        "containment": None,
-        "embedding": None,
-        "prefix": None,
-    }
+    query = TitleIndex.from_titles([title], model)
+    candidates = as_title_index(list2, model)
+    if not len(candidates):
+        return {}
 
-    for candidate in list2:
-        norm1, norm2 = normalize_title(title), normalize_title(candidate)
-        tokens1, tokens2 = tokenize_title(norm1), tokenize_title(norm2)
+    components = score_components_matrix(query, slice(0, 1), candidates)
+    best = {}
+    for metric in WEIGHTS:
+        j = int(components[metric][0].argmax())
+        score = float(components[metric][0, j])
+        if score > 0 and score >= threshold:
+            best[metric] = (candidates.titles[j], score)
+    return best
 
-        score_string = string_similarity(norm1, norm2)
-        score_token = token_similarity(tokens1, tokens2)
-        score_containment = containment_similarity(tokens1, tokens2)
-        score_embedding = embedding_similarity(norm1, norm2, model)
-        score_prefix = prefix_boost(tokens1, tokens2)
 
-        for metric in best_scores.keys():
-            if locals()[f"score_{metric}"] > best_scores[metric]:
-                best_scores[metric] = locals()[f"score_{metric}"]
-                best_titles[metric] = candidate
+# ------------------------
+# Batch Scoring
+# ------------------------
+# Same components and weights as pair_components, but evaluated for a whole
+# block of (query, candidate) pairs at once.
+def token_overlap_matrix(token_sets, postings, n_candidates):
+    """Size of the token set intersection for every (query, candidate) pair."""
+    overlap = np.zeros((len(token_sets), n_candidates))
+    for row, tokens in enumerate(token_sets):
+        for token in tokens:
+            ids = postings.get(token)
+            if ids is not None:
+                overlap[row, ids] += 1
+    return overlap
 
-    return {
-        metric: (best_titles[metric], best_scores[metric])
-        for metric in best_scores
-        if best_scores[metric] >= threshold
-    }
 
+def row_numbers(index, rows):
+    """Row numbers of a slice or an index array of a TitleIndex."""
+    return range(len(index))[rows] if isinstance(rows, slice) else rows
 
-def test_schedules_and_attributes(schedules, attributes, model, threshold):
-    for sched in schedules:
-        best_matches = find_best_match_per_similarity_metric(
-            sched["title"], [a["title"] for a in attributes], model, threshold
+
+def score_components_matrix(query, rows, candidates, embedding=True):
+    """
+    Computes the similarity components as (rows, len(candidates)) matrices.
+
+    `query` and `candidates` are TitleIndex instances, `rows` a slice or an
+    index array of query rows. With embedding=False only the four lexical
+    components are computed.
+    """
+    numbers = row_numbers(query, rows)
+    components = {}
+    with REPORT.stage("string"):
+        components["string"] = (
+            rf_process.cdist(
+                [query.norms[i] for i in numbers],
+                candidates.norms,
+                scorer=fuzz.token_sort_ratio,
+                dtype=np.float64,
+            )
+            / 100.0
         )
-        print(f"\nTesting '{sched['title']}' against attributes:")
-        for metric, (attr_title, score) in best_matches.items():
-            print(f"  {metric}: '{attr_title}' (score: {score:.3f})")
 
+    sizes1 = query.sizes[rows][:, None]
+    sizes2 = candidates.sizes[None, :]
+    has_tokens = (sizes1 > 0) & (sizes2 > 0)
+    with REPORT.stage("token"), np.errstate(divide="ignore", invalid="ignore"):
+        overlap = token_overlap_matrix(
+            [query.token_sets[i] for i in numbers],
+            candidates.postings,
+            len(candidates),
+        )
+        components["token"] = np.where(
+            has_tokens, overlap / (sizes1 + sizes2 - overlap), 0.0
+        )
+    with REPORT.stage("containment"), np.errstate(divide="ignore", invalid="ignore"):
+        components["containment"] = np.where(
+            has_tokens, overlap / np.minimum(sizes1, sizes2), 0.0
+        )
 
-def merge_schedules_and_attributes(schedules, attributes, model, threshold):
-    merged = []
-    for idx, sched in enumerate(schedules):
-        match, score = find_best_match(
-            sched["title"], [a["title"] for a in attributes], model, threshold
+    with REPORT.stage("prefix"):
+        first1 = np.array(
+            [
+                candidates.first_vocab.get(f, -2) if f is not None else -1
+                for f in (query.first_tokens[i] for i in numbers)
+            ]
+        )
+        components["prefix"] = (
+            first1[:, None] == candidates.first_ids[None, :]
+        ).astype(float)
+
+    if embedding:
+        query_emb, candidate_emb = query.embeddings[rows], candidates.embeddings
+        with REPORT.stage("embedding"):
+            components["embedding"] = (query_emb @ candidate_emb.T).astype(np.float64)
+    return components
+
+
+def top_k_indices(scores, k):
+    """Column indices of each row's k highest scores, best first."""
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        top = np.broadcast_to(np.arange(k), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def metric_diagnostics(
+    titles, list2, model, threshold, top_k=3, weights=None, chunk_size=512
+):
+    """
+    Per title, the top_k candidates of every component and of the composite.
+
+    Each component is computed once as a full matrix (in chunks of query
+    rows), so a whole week can be inspected in one pass. Returns one dict
+    per title with the composite match, score and margin to the runner-up
+    and "top": {metric: [(candidate, score), ...]}. `weights` overrides
+    WEIGHTS for the composite, e.g. to try out a different weighting.
+    """
+    query = as_title_index(titles, model)
+    candidates = as_title_index(list2, model)
+    if not len(candidates):
+        return []
+
+    diagnostics = []
+    for start in range(0, len(query), chunk_size):
+        rows = slice(start, min(start + chunk_size, len(query)))
+        components = score_components_matrix(query, rows, candidates)
+        components["composite"] = combine_scores(components, weights)
+        margins = top_two_margins(components["composite"])
+        tops = {
+            metric: (top_k_indices(scores, top_k), scores)
+            for metric, scores in components.items()
+        }
+        for r, title in enumerate(query.titles[rows]):
+            top = {
+                metric: [
+                    (candidates.titles[j], float(scores[r, j])) for j in indices[r]
+                ]
+                for metric, (indices, scores) in tops.items()
+            }
+            match, score = top["composite"][0]
+            diagnostics.append(
+                {
+                    "title": title,
+                    "match": match if score >= threshold else None,
+                    "score": score,
+                    "margin": None if np.isnan(margins[r]) else float(margins[r]),
+                    "top": top,
+                }
+            )
+    return diagnostics
+
+
+def find_best_matches(
+    titles,
+    list2,
+    model,
+    threshold,
+    chunk_size=512,
+    blocker=None,
+    cascade_margin=None,
+    step="match",
+    with_margins=False,
+    workers=1,
+):
+    """
+    Batch version of find_best_match for a whole list of titles.
+
+    Both sides are TitleIndex instances (or plain title lists), scores are
+    computed in blocks of `chunk_size` query rows to bound memory. With a
+    CandidateBlocker only each title's shortlist is scored. With a
+    `cascade_margin` candidates are ranked lexically first and embeddings are
+    only computed for titles where needs_embedding says they could matter;
+    the scores reported for the other titles leave out the embedding term.
+    With workers > 1 the query rows are split across a process pool (see
+    match_rows_parallel).
+    Returns one (best_title, best_score) tuple per title with the same
+    semantics as find_best_match. Every match is added to the run report
+    under `step` (unless it is None) together with its margin to the
+    runner-up; with_margins=True also returns it as a third element.
+    """
+    query = as_title_index(titles, model)
+    candidates = as_title_index(list2, model)
+    if not len(query):
+        return []
+    if not len(candidates):
+        return [(None, 0, None) if with_margins else (None, 0) for _ in query.titles]
+
+    options = (threshold, chunk_size, blocker, cascade_margin)
+    if workers > 1 and len(query) > chunk_size and FORK_AVAILABLE:
+        results, margins, escalated, pairs = match_rows_parallel(
+            query, candidates, options, workers
+        )
+    else:
+        results, margins, escalated, pairs = match_rows(
+            query, candidates, options, 0, len(query)
+        )
+    REPORT.count("pairs_scored", pairs)
+    if cascade_margin is not None:
+        report_cascade(escalated, len(query))
+    return finish_matches(step, query, results, margins, with_margins)
+
+
+def match_rows(query, candidates, options, start, end):
+    """
+    Best match for query rows [start, end).
+
+    Returns (results, margins, escalated titles, pairs scored); the heavy
+    lifting behind find_best_matches, also run inside pool workers.
+    """
+    threshold, chunk_size, blocker, cascade_margin = options
+    results, margins = [], []
+    escalated = pairs = 0
+
+    if blocker is not None:
+        escalated_before, pairs_before = blocker.escalated, blocker.pairs_scored
+        for chunk_start in range(start, end, chunk_size):
+            rows = np.arange(chunk_start, min(chunk_start + chunk_size, end))
+            for row, score, margin in blocker.best_matches(
+                query, rows, threshold, cascade_margin
+            ):
+                if row is not None and score >= threshold:
+                    results.append((candidates.titles[row], score))
+                else:
+                    results.append((None, score))
+                margins.append(margin)
+        return (
+            results,
+            margins,
+            blocker.escalated - escalated_before,
+            blocker.pairs_scored - pairs_before,
+        )
+
+    for chunk_start in range(start, end, chunk_size):
+        rows = slice(chunk_start, min(chunk_start + chunk_size, end))
+        scores, chunk_escalated = score_exhaustive(
+            query, rows, candidates, threshold, cascade_margin
+        )
+        escalated += chunk_escalated
+
+        best_idx = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(best_idx)), best_idx]
+        margins.extend(top_two_margins(scores))
+        pairs += scores.size
+        for idx, score in zip(best_idx, best_scores):
+            score = float(score)
+            if score <= 0:
+                results.append((None, 0))
+            elif score >= threshold:
+                results.append((candidates.titles[idx], score))
+            else:
+                results.append((None, score))
+    return results, margins, escalated, pairs
+
+
+def score_exhaustive(query, rows, candidates, threshold, cascade_margin=None):
+    """
+    Composite scores of query `rows` (slice or index array) against every
+    candidate, and how many rows the cascade escalated to embeddings.
+    """
+    components = score_components_matrix(
+        query, rows, candidates, embedding=cascade_margin is None
+    )
+    scores = combine_scores(components)
+    if cascade_margin is None:
+        return scores, 0
+    escalate = np.flatnonzero(needs_embedding(scores, threshold, cascade_margin))
+    if len(escalate):
+        numbers = np.asarray(row_numbers(query, rows))
+        similarity = query.embed_rows(numbers[escalate]) @ candidates.embeddings.T
+        scores[escalate] += WEIGHTS["embedding"] * similarity.astype(np.float64)
+    return scores, len(escalate)
+
+
+def finish_matches(step, query, results, margins, with_margins):
+    margins = [None if m is None or np.isnan(m) else float(m) for m in margins]
+    if step is not None:
+        for title, (match, score), margin in zip(query.titles, results, margins):
+            record_match(step, title, match, score, margin)
+    if with_margins:
+        return [(m, s, margin) for (m, s), margin in zip(results, margins)]
+    return results
+
+
+def top_two_margins(scores):
+    """Lead of each row's best score over its runner-up (NaN for one column)."""
+    if scores.shape[1] < 2:
+        return np.full(len(scores), np.nan)
+    top_two = np.partition(scores, -2, axis=1)[:, -2:]
+    return top_two[:, 1] - top_two[:, 0]
+
+
+def record_match(step, title, match, score, margin):
+    margin = None if margin is None else round(margin, 4)
+    REPORT.record(f"{step}_score", float(score))
+    if margin is not None:
+        REPORT.record(f"{step}_margin", margin)
+    REPORT.add_item(
+        f"{step}_matches",
+        {
+            "title": title,
+            "match": match,
+            "score": round(float(score), 4),
+            "margin": margin,
+        },
+    )
+
+
+def report_cascade(escalated, total):
+    REPORT.count("cascade_escalated", escalated)
+    print(f"Cascade: {escalated} of {total} titles escalated to embeddings")
+
+
+# ------------------------
+# Parallel Matching
+# ------------------------
+# Workers are forked after the candidate index, the blocker and all embeddings
+# exist, so they inherit them copy-on-write instead of receiving pickled
+# copies per task. Each task only carries a (start, end) row range and returns
+# plain tuples; results are reassembled in row order.
+FORK_AVAILABLE = "fork" in multiprocessing.get_all_start_methods()
+_pool_state = None
+
+
+def _match_rows_worker(bounds):
+    query, candidates, options = _pool_state
+    return match_rows(query, candidates, options, *bounds)
+
+
+def match_rows_parallel(query, candidates, options, workers):
+    """
+    match_rows over a fork-based process pool, same output as serial.
+
+    All embeddings are computed in the parent before forking, so no worker
+    loads the model itself; with a cascade this embeds every title instead of
+    only the escalated ones. Stage timings recorded inside the workers stay in
+    the workers, only the counts returned by match_rows reach the run report.
+    """
+    global _pool_state
+    query.embeddings, candidates.embeddings
+    if options[2] is not None:
+        candidates.postings
+
+    n_tasks = workers * 4
+    step = max(1, -(-len(query) // n_tasks))
+    bounds = [(s, min(s + step, len(query))) for s in range(0, len(query), step)]
+
+    _pool_state = (query, candidates, options)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as pool:
+            parts = list(pool.map(_match_rows_worker, bounds))
+    finally:
+        _pool_state = None
+
+    results, margins, escalated, pairs = [], [], 0, 0
+    for part_results, part_margins, part_escalated, part_pairs in parts:
+        results += part_results
+        margins += part_margins
+        escalated += part_escalated
+        pairs += part_pairs
+    return results, margins, escalated, pairs
+
+
+# ------------------------
+# Candidate Blocking
+# ------------------------
+# A candidate sharing no token with the query scores at most
+# 0.1 * string + 0.2 * embedding, so it can only win if it is a near miss on
+# characters (typos, missing spaces). The blocker therefore shortlists
+# candidates that share a token or enough character n-grams. With an ANN index
+# it also adds each query's nearest candidates by embedding, which catches
+# translated or reworded titles without any lexical overlap.
+def char_ngrams(text, n=3):
+    padded = f" {text} "
+    return {padded[i : i + n] for i in range(len(padded) - n + 1)}
+
+
+class CandidateBlocker:
+    """Inverted index from tokens and character n-grams to candidate rows."""
+
+    def __init__(
+        self,
+        candidates,
+        ngram=3,
+        min_ngram_overlap=0.5,
+        max_df=0.05,
+        ann=None,
+        ann_k=10,
+    ):
+        self.candidates = candidates
+        self.ngram = ngram
+        self.min_ngram_overlap = min_ngram_overlap
+        # Tokens and n-grams occurring in more candidates than this carry
+        # little signal and would put most of the catalog on every shortlist
+        self.max_postings = max(50, int(max_df * len(candidates)))
+
+        grams = [char_ngrams(n, ngram) for n in candidates.norms]
+        self.ngram_counts = np.array([len(g) for g in grams], dtype=float)
+        postings = {}
+        for idx, row_grams in enumerate(grams):
+            for gram in row_grams:
+                postings.setdefault(gram, []).append(idx)
+        self.ngram_postings = {
+            gram: np.array(ids)
+            for gram, ids in postings.items()
+            if len(ids) <= self.max_postings
+        }
+
+        # Frequent tokens do not shortlist (see shortlist_pairs), but still
+        # count towards the token overlap of the pairs that are scored
+        self.frequent_tokens = {}
+        for token, ids in candidates.postings.items():
+            if len(ids) > self.max_postings:
+                members = np.zeros(len(candidates), dtype=bool)
+                members[ids] = True
+                self.frequent_tokens[token] = members
+
+        self.ann = ann
+        self.ann_k = ann_k
+        if ann is not None:
+            # ANN entry position -> candidate rows with that normalized title
+            rows_by_norm = {}
+            for row, norm in enumerate(candidates.norms):
+                rows_by_norm.setdefault(norm, []).append(row)
+            self.ann_rows = [
+                np.array(rows_by_norm.get(key, []), dtype=int) for key in ann.keys
+            ]
+
+        self.queries = 0
+        self.pairs_scored = 0
+        self.fallbacks = 0
+        self.escalated = 0
+
+    def shortlist_pairs(self, query, rows):
+        """
+        (query, candidate, overlap) arrays of the pairs worth scoring.
+
+        `rows` is an index array of query rows; pairs refer to its positions
+        (0..len(rows)-1), are sorted by them and carry the number of shared
+        tokens. A query is paired with the candidates sharing one of its
+        tokens (only its rarest one if all are frequent), with those sharing
+        enough character n-grams and, with an ANN index, with its nearest
+        neighbours by embedding.
+        """
+        with REPORT.stage("shortlist"):
+            return self._shortlist_pairs(query, rows)
+
+    def _shortlist_pairs(self, query, rows):
+        n = len(self.candidates)
+        postings = self.candidates.postings
+        token_keys, other_keys, gram_keys = [], [], []
+        gram_sizes = np.zeros(len(rows))
+        for q, i in enumerate(rows):
+            offset = q * n
+            shared = [t for t in query.token_sets[i] if t in postings]
+            rare = [t for t in shared if t not in self.frequent_tokens]
+            token_keys += [postings[t] + offset for t in rare]
+            if shared and not rare:
+                rarest = min(shared, key=lambda t: len(postings[t]))
+                other_keys.append(postings[rarest] + offset)
+
+            query_grams = char_ngrams(query.norms[i], self.ngram)
+            gram_sizes[q] = len(query_grams)
+            gram_keys += [
+                self.ngram_postings[g] + offset
+                for g in query_grams
+                if g in self.ngram_postings
+            ]
+
+        if self.ann is not None:
+            with REPORT.stage("ann_search"):
+                positions, _ = self.ann.search(query.embed_rows(rows), self.ann_k)
+            for q, neighbours in enumerate(positions):
+                other_keys += [self.ann_rows[p] + q * n for p in neighbours if p >= 0]
+
+        # Pairs are keyed query * n + candidate, one np.unique per source
+        token_pairs, token_counts = unique_keys(token_keys)
+        gram_pairs, gram_counts = unique_keys(gram_keys)
+        dice = (
+            2
+            * gram_counts
+            / (gram_sizes[gram_pairs // n] + self.ngram_counts[gram_pairs % n])
+        )
+        keys = np.unique(
+            np.concatenate(
+                [token_pairs, gram_pairs[dice >= self.min_ngram_overlap], *other_keys]
+            )
+        ).astype(np.int64)
+        q, c = keys // n, keys % n
+
+        # Shared rare tokens were counted above, add the frequent ones
+        overlap = np.zeros(len(keys))
+        if len(token_pairs):
+            pos = np.minimum(np.searchsorted(token_pairs, keys), len(token_pairs) - 1)
+            found = token_pairs[pos] == keys
+            overlap[found] = token_counts[pos[found]]
+        for token, members in self.frequent_tokens.items():
+            has_token = np.array([token in query.token_sets[i] for i in rows])
+            if has_token.any():
+                overlap += has_token[q] & members[c]
+        return q, c, overlap
+
+    def score_pairs(self, query, rows, q, c, overlap, embedding=True):
+        """Similarity components of the shortlisted pairs, as flat arrays."""
+        candidates = self.candidates
+        components = {}
+        with REPORT.stage("string"):
+            components["string"] = (
+                rf_process.cpdist(
+                    [query.norms[rows[k]] for k in q],
+                    [candidates.norms[j] for j in c],
+                    scorer=fuzz.token_sort_ratio,
+                    dtype=np.float64,
+                )
+                / 100.0
+            )
+
+        sizes1, sizes2 = query.sizes[rows][q], candidates.sizes[c]
+        has_tokens = (sizes1 > 0) & (sizes2 > 0)
+        with REPORT.stage("token"), np.errstate(divide="ignore", invalid="ignore"):
+            components["token"] = np.where(
+                has_tokens, overlap / (sizes1 + sizes2 - overlap), 0.0
+            )
+        with REPORT.stage("containment"), np.errstate(
+            divide="ignore", invalid="ignore"
+        ):
+            components["containment"] = np.where(
+                has_tokens, overlap / np.minimum(sizes1, sizes2), 0.0
+            )
+
+        with REPORT.stage("prefix"):
+            first1 = np.array(
+                [
+                    candidates.first_vocab.get(f, -2) if f is not None else -1
+                    for f in (query.first_tokens[i] for i in rows)
+                ]
+            )
+            components["prefix"] = (first1[q] == candidates.first_ids[c]).astype(float)
+
+        if embedding:
+            components["embedding"] = self.embedding_pairs(query, rows, q, c)
+        return components
+
+    def embedding_pairs(self, query, rows, q, c):
+        """
+        Cosine similarity of the pairs, which are sorted by query row.
+
+        One matrix-vector product per query row: gathering both sides of
+        every pair would copy each query embedding once per candidate.
+        """
+        query_emb = query.embed_rows(rows)
+        candidate_emb = self.candidates.embeddings
+        bounds = np.searchsorted(q, np.arange(len(rows) + 1))
+        similarity = np.empty(len(q))
+        with REPORT.stage("embedding"):
+            for k in np.flatnonzero(np.diff(bounds)):
+                low, high = bounds[k], bounds[k + 1]
+                similarity[low:high] = candidate_emb[c[low:high]] @ query_emb[k]
+        return similarity
+
+    def best_matches(self, query, rows, threshold=0, cascade_margin=None):
+        """
+        Best (row, score, margin) over each query row's shortlist.
+
+        `rows` is an index array of query rows, scored together as sparse
+        pairs. Rows with an empty shortlist are scored against the whole
+        catalog in one matrix. `margin` is the lead over the runner-up
+        within the scored rows.
+        """
+        self.queries += len(rows)
+        q, c, overlap = self.shortlist_pairs(query, rows)
+        self.pairs_scored += len(q)
+
+        components = self.score_pairs(
+            query, rows, q, c, overlap, embedding=cascade_margin is None
         )
-        print(f"Matching '{sched['title']}' -> '{match}' (score: {score:.3f})")
+        scores = combine_scores(components)
+        best, second = top_two_per_group(q, c, scores, len(rows))
+        if cascade_margin is not None:
+            scored = best >= 0
+            escalate = np.zeros(len(rows), dtype=bool)
+            escalate[scored] = needs_embedding_top(
+                scores[best[scored]],
+                np.where(second[scored] >= 0, scores[second[scored]], -np.inf),
+                threshold,
+                cascade_margin,
+            )
+            self.escalated += int(escalate.sum())
+            pairs = np.flatnonzero(escalate[q])
+            if len(pairs):
+                escalated_rows = np.flatnonzero(escalate)
+                # Pairs of the escalated rows, renumbered among them
+                local = np.searchsorted(escalated_rows, q[pairs])
+                scores[pairs] += WEIGHTS["embedding"] * self.embedding_pairs(
+                    query, rows[escalated_rows], local, c[pairs]
+                )
+                best, second = top_two_per_group(q, c, scores, len(rows))
+
+        results = [None] * len(rows)
+        for k in np.flatnonzero(best >= 0):
+            score = float(scores[best[k]])
+            margin = scores[best[k]] - scores[second[k]] if second[k] >= 0 else np.nan
+            if score <= 0:
+                results[k] = (None, 0, margin)
+            else:
+                results[k] = (int(c[best[k]]), score, margin)
+
+        empty = np.flatnonzero(best < 0)
+        if len(empty):
+            self.fallbacks += len(empty)
+            self.pairs_scored += len(empty) * len(self.candidates)
+            matrix, escalated = score_exhaustive(
+                query, rows[empty], self.candidates, threshold, cascade_margin
+            )
+            self.escalated += escalated
+            for k, row_scores, margin in zip(empty, matrix, top_two_margins(matrix)):
+                j = int(row_scores.argmax())
+                if row_scores[j] <= 0:
+                    results[k] = (None, 0, margin)
+                else:
+                    results[k] = (j, float(row_scores[j]), margin)
+        return results
+
+
+def unique_keys(keys):
+    """Sorted unique pair keys and how often each occurs."""
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.unique(np.concatenate(keys), return_counts=True)
+
+
+def top_two_per_group(q, c, scores, n_groups):
+    """
+    Pair index of each group's best and runner-up score, -1 where missing.
+
+    `q` holds the group of every pair and is sorted. Ties go to the lower
+    candidate row `c`, as with argmax over a full score row.
+    """
+    if not len(q):
+        return np.full(n_groups, -1), np.full(n_groups, -1)
+    order = np.lexsort((c, -scores, q))
+    groups = np.arange(n_groups)
+    starts = np.searchsorted(q, groups)
+    counts = np.searchsorted(q, groups, side="right") - starts
+    best = np.where(counts > 0, order[np.minimum(starts, len(q) - 1)], -1)
+    second = np.where(counts > 1, order[np.minimum(starts + 1, len(q) - 1)], -1)
+    return best, second
+
+
+def candidate_ann_index(candidates, path=None, model_id=None, recall_target=0.95):
+    """
+    IVFIndex over a TitleIndex's embeddings, keyed by normalized title.
+
+    A stored index for the same embedder is extended with titles it has not
+    seen; it is rebuilt when more than half of its entries are no longer
+    candidates. Without `path` the index is built in memory only.
+    """
+    stored = IVFIndex.load(path) if path else None
+    if stored is not None and stored.model != model_id:
+        stored = None
+    first_rows = {}
+    for row, norm in enumerate(candidates.norms):
+        first_rows.setdefault(norm, row)
+    keys = list(first_rows)
+
+    with REPORT.stage("ann_index"):
+        vectors = candidates.embeddings[list(first_rows.values())]
+        kept = sum(key in first_rows for key in stored.keys) if stored else 0
+        if stored is not None and 2 * kept >= len(stored):
+            added = stored.add(keys, vectors)
+            if added:
+                stored.calibrate()
+            REPORT.count("ann_added", added)
+            index = stored
+        else:
+            index = IVFIndex(recall_target=recall_target).build(
+                keys, vectors, model=model_id
+            )
+            REPORT.count("ann_built")
+    if path:
+        index.save(path)
+    return index
+
+
+# ------------------------
+# Incremental Matching
+# ------------------------
+# The manifest keeps, per merge step, the candidate titles of the last run and
+# every query's (match, score, margin) together with the fingerprint of the
+# candidate set it was scored against. A stored result is reused when:
+#   - the candidate set is unchanged, or
+#   - (exhaustive scoring only) the stored match is still a candidate, it had
+#     no tie, and none of the newly added candidates scores as high.
+# Removed non-winning candidates cannot change the winner, so this gives the
+# same output as a full run. Blocking and cascade decisions depend on the
+# whole candidate set, so there only unchanged sets are reused.
+MANIFEST_VERSION = 1
+
+
+def fingerprint(value):
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()[:16]
+
+
+class MatchManifest:
+    """Matches of the previous run, reused where the candidates allow it."""
+
+    def __init__(self, path, config, full=False):
+        self.path = Path(path)
+        self.config = {"version": MANIFEST_VERSION, **config}
+        self.steps = {}
+        self.new_steps = {}
+        if not full and self.path.exists():
+            stored = json.loads(self.path.read_text(encoding="utf-8"))
+            if stored.get("config") == self.config:
+                self.steps = stored.get("steps", {})
+
+    def find_best_matches(self, query, candidates, model, threshold, step, **kwargs):
+        """find_best_matches that only scores titles the manifest cannot answer."""
+        stored = self.steps.get(step, {})
+        stored_matches = stored.get("matches", {})
+        current = fingerprint(sorted(candidates.titles))
+        exhaustive = (
+            kwargs.get("blocker") is None and kwargs.get("cascade_margin") is None
+        )
+
+        old_titles = set(stored.get("candidates", []))
+        added = [r for r in candidates.records if r["title"] not in old_titles]
+        removed = old_titles - set(candidates.titles)
+
+        results = [None] * len(query)
+        check = []
+        for i, title in enumerate(query.titles):
+            entry = stored_matches.get(title)
+            if entry is None:
+                continue
+            if entry["candidates"] == current:
+                results[i] = (entry["match"], entry["score"], entry["margin"])
+            elif (
+                exhaustive
+                and entry["candidates"] == stored.get("fingerprint")
+                and entry["match"] not in removed
+                and (entry["margin"] is None or entry["margin"] > 1e-9)
+            ):
+                check.append(i)
+
+        # Best newly added candidate for every title that might be answerable
+        if check and added:
+            newcomers = find_best_matches(
+                TitleIndex([query.records[i] for i in check], model),
+                TitleIndex(added, model),
+                model,
+                threshold,
+                step=None,
+            )
+        else:
+            newcomers = [(None, 0)] * len(check)
+        for i, (match, score) in zip(check, newcomers):
+            entry = stored_matches[query.titles[i]]
+            beaten = (
+                score >= entry["score"] - 1e-9
+                if entry["match"] is not None
+                else match is not None
+            )
+            if not beaten:
+                margin = entry["margin"]
+                if entry["match"] is not None and match is not None:
+                    margin = min(margin, entry["score"] - score)
+                results[i] = (entry["match"], entry["score"], margin)
+
+        rescore = [i for i, result in enumerate(results) if result is None]
+        if rescore:
+            subset = TitleIndex([query.records[i] for i in rescore], model)
+            for i, result in zip(
+                rescore,
+                find_best_matches(
+                    subset,
+                    candidates,
+                    model,
+                    threshold,
+                    step=None,
+                    with_margins=True,
+                    **kwargs,
+                ),
+            ):
+                results[i] = result
+        REPORT.count("incremental_reused", len(query) - len(rescore))
+        REPORT.count("incremental_rescored", len(rescore))
+
+        self.new_steps[step] = {
+            "fingerprint": current,
+            "candidates": sorted(candidates.titles),
+            "matches": {
+                title: {
+                    "match": match,
+                    "score": score,
+                    "margin": margin,
+                    "candidates": current,
+                }
+                for title, (match, score, margin) in zip(query.titles, results)
+            },
+        }
+        return finish_matches(
+            step,
+            query,
+            [(m, s) for m, s, _ in results],
+            [margin for _, _, margin in results],
+            with_margins=False,
+        )
+
+    def save(self):
+        """
+        Writes the steps matched in this run; steps not run (e.g. a pipeline
+        stage that was skipped) keep their stored matches.
+        """
+        self.path.write_text(
+            json.dumps(
+                {"config": self.config, "steps": {**self.steps, **self.new_steps}},
+                indent=2,
+                ensure_ascii=False,
+            ),
+            encoding="utf-8",
+        )
+
+
+def test_schedules_and_attributes(schedules, attributes, model, threshold):
+    for row in metric_diagnostics(
+        TitleIndex(schedules, model), TitleIndex(attributes, model), model, threshold
+    ):
+        print(f"\nTesting '{row['title']}' against attributes:")
+        for metric in WEIGHTS:
+            attr_title, score = row["top"][metric][0]
+            if score > 0 and score >= threshold:
+                print(f"  {metric}: '{attr_title}' (score: {score:.3f})")
+
+
+def merge_schedules_and_attributes(
+    schedules,
+    attributes,
+    model,
+    threshold,
+    blocking=False,
+    cascade_margin=None,
+    manifest=None,
+    workers=1,
+    start_id=0,
+):
+    merged = []
+    attribute_index = as_record_index(attributes, model)
+    find = manifest.find_best_matches if manifest else find_best_matches
+    matches = find(
+        TitleIndex(schedules, model),
+        attribute_index,
+        model,
+        threshold,
+        blocker=attribute_index.blocker if blocking else None,
+        cascade_margin=cascade_margin,
+        step="attributes",
+        workers=workers,
+    )
+    for idx, (sched, (match, score)) in enumerate(
+        zip(schedules, matches), start=start_id
+    ):
+        log(f"Matching '{sched['title']}' -> '{match}' (score: {score:.3f})")
         if match:
 
-            info = next(a for a in attributes if a["title"] == match)
+            with REPORT.stage("lookup"):
+                info = attribute_index.record(match)
             merged.append(
                 {
                     "id": idx,
@@ -172,7 +1184,7 @@ def merge_schedules_and_attributes(schedules, attributes, model, threshold):
                 }
             )
         else:
-            print(f"No matching attribute found for schedule '{sched['title']}'")
+            log(f"No matching attribute found for schedule '{sched['title']}'")
             # fallback defaults (like your JS version)
             merged.append(
                 {
@@ -195,43 +1207,334 @@ def merge_schedules_and_attributes(schedules, attributes, model, threshold):
     return merged
 
 
-def merge_with_posters(movies, posters, model, threshold):
-
-    for movie in movies:
-        match, score = find_best_match(
-            movie["title"], [p["title"] for p in posters], model, threshold
-        )
-        print(f"Matching '{movie['title']}' -> '{match}' (score: {score:.3f})")
+def merge_with_posters(
+    movies,
+    posters,
+    model,
+    threshold,
+    blocking=False,
+    cascade_margin=None,
+    manifest=None,
+    workers=1,
+):
+    poster_index = as_record_index(posters, model)
+    find = manifest.find_best_matches if manifest else find_best_matches
+    matches = find(
+        TitleIndex(movies, model),
+        poster_index,
+        model,
+        threshold,
+        blocker=poster_index.blocker if blocking else None,
+        cascade_margin=cascade_margin,
+        step="posters",
+        workers=workers,
+    )
+    for movie, (match, score) in zip(movies, matches):
+        log(f"Matching '{movie['title']}' -> '{match}' (score: {score:.3f})")
         if match:
-            poster = next(p for p in posters if p["title"] == match)
+            with REPORT.stage("lookup"):
+                poster = poster_index.record(match)
             movie["posterUrl"] = poster["src"]
     return movies
 
 
+# ------------------------
+# Streaming Mode
+# ------------------------
+# Schedules are read one JSON line at a time and merged in batches against
+# attribute and poster indexes built once up front; every finished batch is
+# appended to the output and flushed, so memory stays flat in the number of
+# schedules and an interrupted run leaves the batches it completed.
+def read_records(path):
+    """Yields records from a JSON-lines file (or, as a fallback, a JSON array)."""
+    path = Path(path)
+    if path.suffix != ".jsonl":
+        yield from load_json(path)
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batched(records, size):
+    records = iter(records)
+    while batch := list(itertools.islice(records, size)):
+        yield batch
+
+
+def stream_merge(
+    schedules,
+    attribute_index,
+    poster_index,
+    model,
+    threshold,
+    out,
+    batch_size=256,
+    **options,
+):
+    """
+    Merges an iterable of schedules batch by batch and writes JSON lines.
+
+    `attribute_index` and `poster_index` are TitleIndex instances that stay
+    warm across batches (embeddings, postings and blocker are reused).
+    Returns the number of records written.
+    """
+    written = 0
+    for batch in batched(schedules, batch_size):
+        merged = merge_schedules_and_attributes(
+            batch, attribute_index, model, threshold, start_id=written, **options
+        )
+        merge_with_posters(merged, poster_index, model, threshold, **options)
+        with REPORT.stage("json_io"):
+            for movie in merged:
+                out.write(json.dumps(movie, ensure_ascii=False) + "\n")
+            out.flush()
+        written += len(merged)
+        REPORT.count("stream_batches")
+    return written
+
+
 # ------------------------
 # Main Execution
 # ------------------------
-if __name__ == "__main__":
-    schedules = json.loads(
-        Path("src/data/movieSchedules.json").read_text(encoding="utf-8")
-    )
-    attributes = json.loads(
-        Path("src/data/movieAttributes.json").read_text(encoding="utf-8")
-    )
-    posters = json.loads(
-        Path("src/data/moviePosterUrls.json").read_text(encoding="utf-8")
+DATA_DIR = Path("src/data")
+OUTPUT_PATH = DATA_DIR / "source_movie_data.json"
+MANIFEST_PATH = OUTPUT_PATH.with_suffix(".manifest.json")
+ANN_DIR = Path(".cache/ann")
+STREAM_INPUT_PATH = DATA_DIR / "movieSchedules.jsonl"
+STREAM_OUTPUT_PATH = OUTPUT_PATH.with_suffix(".jsonl")
+# Report details kept per list in --stream mode, see RunReport.max_items
+STREAM_MAX_ITEMS = 1000
+
+
+def load_json(path):
+    with REPORT.stage("json_io"):
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def embedder_id(model):
+    """Embedder name plus IDF fingerprint: equal ids give equal embeddings."""
+    idf = getattr(model, "idf", None)
+    return {
+        "embedder": model.name,
+        "idf": None if idf is None else fingerprint(idf.round(6).tolist()),
+    }
+
+
+def candidate_indexes(attributes, posters, model, args):
+    """Attribute and poster TitleIndexes, with ANN indexes attached for --ann."""
+    attribute_index = TitleIndex(attributes, model)
+    poster_index = TitleIndex(posters, model)
+    if args.ann:
+        model_id = fingerprint(embedder_id(model))
+        for name, index in (("attributes", attribute_index), ("posters", poster_index)):
+            if len(index):
+                index.ann = candidate_ann_index(index, ANN_DIR / name, model_id)
+    return attribute_index, poster_index
+
+
+def main_stream(args):
+    """--stream: JSON lines in, JSON lines out, no match manifest."""
+    attributes = load_json(DATA_DIR / "movieAttributes.json")
+    posters = load_json(DATA_DIR / "moviePosterUrls.json")
+    model = create_embedder(
+        args.embedder, args.model, None if args.no_cache else args.cache_dir
     )
+    if isinstance(model, HashedNgramEmbedder):
+        # Schedules are not known up front, so IDF only covers the candidates
+        model.fit(normalize_title(r["title"]) for r in attributes + posters)
+
+    THRESHOLD = 0.2
+    # Keeps the per-match report details and score distributions from
+    # growing with the input
+    REPORT.max_items = STREAM_MAX_ITEMS
+    output_path = Path(args.output or STREAM_OUTPUT_PATH)
+    with open(output_path, "w", encoding="utf-8") as out:
+        written = stream_merge(
+            read_records(args.input or STREAM_INPUT_PATH),
+            *candidate_indexes(attributes, posters, model, args),
+            model,
+            THRESHOLD,
+            out,
+            batch_size=args.batch_size,
+            blocking=args.blocking or args.ann,
+            cascade_margin=args.cascade_margin if args.cascade else None,
+            workers=args.workers,
+        )
+    print(f"Streamed {written} merged movies to {output_path.as_posix()}")
+
+    cache = getattr(model, "cache", None)
+    if cache is not None:
+        cache.save()
+
+
+def main(args):
+    global VERBOSE
+    VERBOSE = not args.quiet
+    if args.stream:
+        return main_stream(args)
 
-    model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+    schedules = load_json(DATA_DIR / "movieSchedules.json")
+    attributes = load_json(DATA_DIR / "movieAttributes.json")
+    posters = load_json(DATA_DIR / "moviePosterUrls.json")
+
+    model = create_embedder(
+        args.embedder, args.model, None if args.no_cache else args.cache_dir
+    )
+    if isinstance(model, HashedNgramEmbedder):
+        model.fit(normalize_title(r["title"]) for r in schedules + attributes + posters)
 
     THRESHOLD = 0.2
+    cascade_margin = args.cascade_margin if args.cascade else None
+    blocking = args.blocking or args.ann
+
+    manifest = MatchManifest(
+        MANIFEST_PATH,
+        {
+            **embedder_id(model),
+            "threshold": THRESHOLD,
+            "weights": WEIGHTS,
+            "blocking": blocking,
+            "ann": args.ann,
+            "cascade_margin": cascade_margin,
+        },
+        full=args.full,
+    )
+    attribute_index, poster_index = candidate_indexes(attributes, posters, model, args)
 
     # test_schedules_and_attributes(schedules, attributes, model, THRESHOLD)
-    merged1 = merge_schedules_and_attributes(schedules, attributes, model, THRESHOLD)
-    merged2 = merge_with_posters(merged1, posters, model, THRESHOLD)
+    merged1 = merge_schedules_and_attributes(
+        schedules,
+        attribute_index,
+        model,
+        THRESHOLD,
+        blocking=blocking,
+        cascade_margin=cascade_margin,
+        manifest=manifest,
+        workers=args.workers,
+    )
+    merged2 = merge_with_posters(
+        merged1,
+        poster_index,
+        model,
+        THRESHOLD,
+        blocking=blocking,
+        cascade_margin=cascade_margin,
+        manifest=manifest,
+        workers=args.workers,
+    )
+
+    with REPORT.stage("json_io"):
+        OUTPUT_PATH.write_text(
+            json.dumps(merged2, indent=2, ensure_ascii=False), encoding="utf-8"
+        )
 
-    Path("src/data/source_movie_data.json").write_text(
-        json.dumps(merged2, indent=2, ensure_ascii=False), encoding="utf-8"
+    print(f"Saved {len(merged2)} merged movies to {OUTPUT_PATH.as_posix()}")
+    manifest.save()
+    print(
+        f"Incremental: reused {REPORT.counters.get('incremental_reused', 0)}, "
+        f"scored {REPORT.counters.get('incremental_rescored', 0)} titles"
+    )
+
+    cache = getattr(model, "cache", None)
+    if cache is not None:
+        cache.save()
+        print(
+            f"Embedding cache: {cache.hits} hits, {cache.misses} misses, "
+            f"{len(cache)} entries"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Merge schedules, attributes and posters."
+    )
+    parser.add_argument(
+        "--embedder",
+        choices=BACKENDS,
+        default="sentence-transformers",
+        help="Title embedding backend",
+    )
+    parser.add_argument("--model", default=MODEL_NAME, help="SentenceTransformer model")
+    parser.add_argument(
+        "--cache-dir",
+        default=".cache/embeddings",
+        help="Directory of the persistent embedding cache",
     )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always embed titles with the model"
+    )
+    parser.add_argument(
+        "--blocking",
+        action="store_true",
+        help="Only score candidates sharing a token or character n-grams",
+    )
+    parser.add_argument(
+        "--ann",
+        action="store_true",
+        help="Block with an approximate nearest-neighbour index over embeddings "
+        "as well (implies --blocking)",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Rank lexically and only embed titles without a clear winner",
+    )
+    parser.add_argument(
+        "--cascade-margin",
+        type=float,
+        default=CASCADE_MARGIN,
+        help="Lead over the runner-up below which a title is embedded; "
+        "smaller than the default it may change matches",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Score title chunks in this many processes",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the match manifest and score every title again",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="Skip the per-title progress lines"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Read schedules as JSON lines and write merged JSON lines in batches",
+    )
+    parser.add_argument(
+        "--input",
+        help=f"Schedules for --stream (default {STREAM_INPUT_PATH.as_posix()})",
+    )
+    parser.add_argument(
+        "--output",
+        help=f"Output of --stream (default {STREAM_OUTPUT_PATH.as_posix()})",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Schedules matched per batch with --stream",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Also write cProfile output next to the run report",
+    )
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(main, args)
+        profiler.dump_stats(OUTPUT_PATH.with_suffix(".prof"))
+    else:
+        main(args)
 
-    print(f"Saved {len(merged2)} merged movies to src/data/source_movie_data.json")
+    report_path = OUTPUT_PATH.with_suffix(".run.json")
+    REPORT.write(report_path)
+    print(f"Saved run report to {report_path.as_posix()}")
@@ -0,0 +1,304 @@
+import argparse
+import json
+import os
+import socketserver
+import sys
+import time
+from collections import OrderedDict
+
+from embedders import BACKENDS, MODEL_NAME, create_embedder
+from matcher import (
+    CASCADE_MARGIN,
+    CandidateBlocker,
+    TitleIndex,
+    find_best_matches,
+    fingerprint,
+)
+from run_report import REPORT
+
+# ------------------------
+# Warm Matcher Daemon
+# ------------------------
+# Keeps the embedder loaded and candidate indexes cached between requests, so
+# re-matching a few titles costs milliseconds instead of a torch cold start.
+# Requests and responses are single-line JSON objects, served either on
+# stdin/stdout or on a Unix socket (one or more requests per connection):
+#
+#   {"id": 1, "cmd": "match", "queries": ["..."], "candidates": ["..."]}
+#   -> {"id": 1, "ok": true, "candidates_key": "...",
+#       "matches": [{"title", "match", "index", "score", "margin"}, ...]}
+#   {"cmd": "match", "queries": [...], "candidates_key": "..."}  reuses a set
+#   {"cmd": "health"} / {"cmd": "stats"} / {"cmd": "shutdown"}
+#
+# "threshold" may be given per match request, it defaults to the one of
+# matcher.py. Failures come back as {"ok": false, "error": "..."}.
+#
+#   python scripts/matcher_daemon.py --socket /tmp/matcher.sock
+
+
+class RequestError(Exception):
+    """A malformed request; reported to the client, the daemon keeps running."""
+
+
+class MatcherService:
+    """Dispatches protocol commands against one warm embedder."""
+
+    def __init__(
+        self,
+        model,
+        threshold=0.2,
+        blocking=False,
+        cascade_margin=None,
+        max_candidate_sets=16,
+    ):
+        self.model = model
+        self.threshold = threshold
+        self.blocking = blocking
+        self.cascade_margin = cascade_margin
+        self.max_candidate_sets = max_candidate_sets
+        self.candidate_sets = OrderedDict()  # key -> (TitleIndex, blocker)
+        self.started = time.time()
+        self.requests = 0
+        self.queries = 0
+        self.running = True
+
+    def warm_up(self):
+        """Loads the model (and imports its framework) before the first request."""
+        with REPORT.stage("warm_up"):
+            self.model.encode_batch(["warm up"])
+
+    def candidate_set(self, request):
+        if "candidates" in request:
+            titles = request["candidates"]
+            if not isinstance(titles, list) or not all(
+                isinstance(t, str) for t in titles
+            ):
+                raise RequestError("'candidates' must be a list of titles")
+            key = fingerprint(titles)
+            if key not in self.candidate_sets:
+                with REPORT.stage("candidate_index"):
+                    index = TitleIndex.from_titles(titles, self.model)
+                    index.embeddings
+                    blocker = CandidateBlocker(index) if self.blocking else None
+                self.candidate_sets[key] = (index, blocker)
+                REPORT.count("candidate_sets_built")
+        elif "candidates_key" in request:
+            key = request["candidates_key"]
+            if key not in self.candidate_sets:
+                raise RequestError(f"Unknown or evicted candidates_key: {key}")
+        else:
+            raise RequestError("match needs 'candidates' or 'candidates_key'")
+
+        self.candidate_sets.move_to_end(key)
+        while len(self.candidate_sets) > self.max_candidate_sets:
+            self.candidate_sets.popitem(last=False)
+        return key, self.candidate_sets[key]
+
+    def match(self, request):
+        queries = request.get("queries")
+        if not isinstance(queries, list) or not all(
+            isinstance(q, str) for q in queries
+        ):
+            raise RequestError("'queries' must be a list of titles")
+        threshold = float(request.get("threshold", self.threshold))
+        key, (candidates, blocker) = self.candidate_set(request)
+
+        with REPORT.stage("match"):
+            results = find_best_matches(
+                TitleIndex.from_titles(queries, self.model),
+                candidates,
+                self.model,
+                threshold,
+                blocker=blocker,
+                cascade_margin=self.cascade_margin,
+                step=None,
+                with_margins=True,
+            )
+        self.queries += len(queries)
+        positions = {}
+        for i, title in enumerate(candidates.titles):
+            positions.setdefault(title, i)
+        return {
+            "candidates_key": key,
+            "matches": [
+                {
+                    "title": title,
+                    "match": match,
+                    "index": positions.get(match),
+                    "score": round(float(score), 4),
+                    "margin": None if margin is None else round(margin, 4),
+                }
+                for title, (match, score, margin) in zip(queries, results)
+            ],
+        }
+
+    def health(self, request):
+        return {"status": "ready", "embedder": self.model.name}
+
+    def stats(self, request):
+        cache = getattr(self.model, "cache", None)
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "queries": self.queries,
+            "candidate_sets": len(self.candidate_sets),
+            "embedding_cache_entries": None if cache is None else len(cache),
+            "report": REPORT.to_dict(),
+        }
+
+    def shutdown(self, request):
+        self.running = False
+        return {"status": "stopping"}
+
+    COMMANDS = ("match", "health", "stats", "shutdown")
+
+    def handle(self, request):
+        """Answers one decoded request; never raises for bad input."""
+        self.requests += 1
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            if not isinstance(request, dict):
+                raise RequestError("Request must be a JSON object")
+            cmd = request.get("cmd")
+            if cmd not in self.COMMANDS:
+                raise RequestError(f"Unknown cmd: {cmd!r}")
+            response = {"ok": True, **getattr(self, cmd)(request)}
+        except RequestError as e:
+            response = {"ok": False, "error": str(e)}
+        except Exception as e:  # keep serving after a bug in one request
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        if request_id is not None:
+            response["id"] = request_id
+        return response
+
+    def handle_line(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return {"ok": False, "error": f"Invalid JSON: {e}"}
+        return self.handle(request)
+
+    def close(self):
+        cache = getattr(self.model, "cache", None)
+        if cache is not None:
+            cache.save()
+
+
+# ------------------------
+# Transports
+# ------------------------
+def serve_lines(service, reader, writer):
+    """Answers newline-delimited requests until EOF or a shutdown command."""
+    for line in reader:
+        if not line.strip():
+            continue
+        response = service.handle_line(line)
+        writer.write(json.dumps(response, ensure_ascii=False) + "\n")
+        writer.flush()
+        if not service.running:
+            break
+
+
+def serve_socket(service, path):
+    """Serves the line protocol on a Unix socket, one connection at a time."""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            reader = (line.decode("utf-8") for line in self.rfile)
+            writer = _TextWriter(self.wfile)
+            serve_lines(service, reader, writer)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with socketserver.UnixStreamServer(path, Handler) as server:
+        server.timeout = 0.5
+        print(f"Matcher daemon listening on {path}", file=sys.stderr)
+        try:
+            while service.running:
+                server.handle_request()
+        finally:
+            os.unlink(path)
+
+
+class _TextWriter:
+    def __init__(self, raw):
+        self.raw = raw
+
+    def write(self, text):
+        self.raw.write(text.encode("utf-8"))
+
+    def flush(self):
+        self.raw.flush()
+
+
+# ------------------------
+# Main Execution
+# ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve title matching from a warm model."
+    )
+    parser.add_argument(
+        "--socket", help="Listen on this Unix socket instead of stdin/stdout"
+    )
+    parser.add_argument(
+        "--embedder",
+        choices=BACKENDS,
+        default="sentence-transformers",
+        help="Title embedding backend (hashed n-grams are used without IDF)",
+    )
+    parser.add_argument("--model", default=MODEL_NAME, help="SentenceTransformer model")
+    parser.add_argument(
+        "--cache-dir",
+        default=".cache/embeddings",
+        help="Directory of the persistent embedding cache",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always embed titles with the model"
+    )
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument(
+        "--blocking",
+        action="store_true",
+        help="Only score candidates sharing a token or character n-grams",
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help="Rank lexically and only embed titles without a clear winner",
+    )
+    parser.add_argument(
+        "--cascade-margin",
+        type=float,
+        default=CASCADE_MARGIN,
+        help="Lead over the runner-up below which a title is embedded; "
+        "smaller than the default it may change matches",
+    )
+    parser.add_argument(
+        "--max-candidate-sets",
+        type=int,
+        default=16,
+        help="Candidate indexes kept warm between requests",
+    )
+    args = parser.parse_args()
+
+    service = MatcherService(
+        create_embedder(
+            args.embedder, args.model, None if args.no_cache else args.cache_dir
+        ),
+        threshold=args.threshold,
+        blocking=args.blocking,
+        cascade_margin=args.cascade_margin if args.cascade else None,
+        max_candidate_sets=args.max_candidate_sets,
+    )
+    service.warm_up()
+    try:
+        if args.socket:
+            serve_socket(service, args.socket)
+        else:
+            # Progress prints (e.g. the cascade summary) must not end up
+            # between protocol lines
+            responses, sys.stdout = sys.stdout, sys.stderr
+            serve_lines(service, sys.stdin, responses)
+    finally:
+        service.close()
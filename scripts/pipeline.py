@@ -0,0 +1,476 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from run_report import REPORT
+
+# ------------------------
+# Data Pipeline
+# ------------------------
+# The Python side of the weekly update as declared stages with their inputs
+# and outputs:
+#
+#   match            schedules + attributes       -> .cache/pipeline/matched.json
+#   merge_posters    matched + poster URLs        -> source_movie_data.json
+#   transform        node scripts/transformData   -> views, movies-reference.json
+#   download         movies-reference.json        -> src/data/posters
+#   render_existing  posters already on disk      -> public/poster-variants
+#   render           downloaded posters           -> public/poster-variants
+#
+# A stage's fingerprint hashes the contents of its inputs, its code and its
+# settings. A stage whose fingerprint and outputs are the same as after its
+# last successful run (.cache/pipeline/state.json) is skipped. Stages start
+# as soon as the stages they come after are done, so rendering the posters
+# already on disk overlaps with matching and downloading; `render` then only
+# picks up what the download changed (see the variant manifest).
+# render_existing reads a hardlinked snapshot of the posters, the download
+# replaces and prunes files in src/data/posters meanwhile.
+#
+#   python scripts/pipeline.py                 # all stages
+#   python scripts/pipeline.py --force render  # re-run one stage regardless
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+DATA_DIR = Path("src/data")
+STATE_PATH = Path(".cache/pipeline/state.json")
+MATCHED_PATH = Path(".cache/pipeline/matched.json")
+SNAPSHOT_DIR = Path(".cache/pipeline/posters")
+SCHEDULES_PATH = DATA_DIR / "movieSchedules.json"
+ATTRIBUTES_PATH = DATA_DIR / "movieAttributes.json"
+POSTER_URLS_PATH = DATA_DIR / "moviePosterUrls.json"
+SOURCE_DATA_PATH = DATA_DIR / "source_movie_data.json"
+REFERENCE_PATH = DATA_DIR / "movies-reference.json"
+POSTERS_DIR = DATA_DIR / "posters"
+VARIANTS_DIR = Path("public/poster-variants")
+RENDITIONS_PATH = DATA_DIR / "posterRenditions.json"
+VARIANT_MANIFEST_PATH = DATA_DIR / "posters.variants.json"
+POSTER_HASHES_PATH = DATA_DIR / "posters.hashes.json"
+LOGO_FILES = [Path("public/preview_image.png"), Path("public/preview_image_sq.png")]
+TRANSFORM_OUTPUTS = [
+    DATA_DIR / name
+    for name in (
+        "date-view.json",
+        "room-view.json",
+        "movie-view.json",
+        "movies-reference.json",
+        "theaters-reference.json",
+        "event-view.json",
+        "show-lookup.json",
+    )
+]
+REPORT_PATH = DATA_DIR / "pipeline.run.json"
+MATCH_THRESHOLD = 0.2  # as in matcher.main
+
+
+@dataclass
+class Stage:
+    name: str
+    run: object  # callable without arguments
+    inputs: list
+    outputs: list
+    after: tuple = ()
+    code: tuple = ()
+    settings: dict = field(default_factory=dict)
+
+
+def path_digest(path):
+    """sha1 of a file, of a directory's files and names, or None if missing."""
+    path = Path(path)
+    if path.is_file():
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    if path.is_dir():
+        digest = hashlib.sha1()
+        for child in sorted(path.rglob("*")):
+            if child.is_file() and not child.name.startswith("."):
+                digest.update(child.relative_to(path).as_posix().encode("utf-8"))
+                digest.update(path_digest(child).encode("ascii"))
+        return digest.hexdigest()
+    return None
+
+
+def stage_fingerprint(stage):
+    description = {
+        "settings": stage.settings,
+        "inputs": {Path(p).as_posix(): path_digest(p) for p in stage.inputs},
+        "code": {Path(p).name: path_digest(p) for p in stage.code},
+    }
+    encoded = json.dumps(description, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+class Pipeline:
+    """Runs stages in dependency order, concurrently where they allow it."""
+
+    def __init__(self, stages, state_path=STATE_PATH, force=(), max_parallel=3):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = Path(state_path)
+        self.force = set(force)
+        self.max_parallel = max_parallel
+        self.state = {}
+        if self.state_path.exists():
+            try:
+                self.state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                print(f"Warning: Ignoring unreadable pipeline state: {e}")
+
+    def is_current(self, stage, fingerprint):
+        last = self.state.get(stage.name)
+        return (
+            stage.name not in self.force
+            and last is not None
+            and last["fingerprint"] == fingerprint
+            and all(
+                path_digest(p) == last["outputs"].get(Path(p).as_posix())
+                for p in stage.outputs
+            )
+        )
+
+    def run_stage(self, stage):
+        """(status, seconds) of one stage: "skipped", "ran" or "failed"."""
+        start = time.perf_counter()
+        fingerprint = stage_fingerprint(stage)
+        if self.is_current(stage, fingerprint):
+            return "skipped", time.perf_counter() - start
+        print(f"\n=== {stage.name.upper()} ===")
+        try:
+            with REPORT.stage(f"pipeline_{stage.name}"):
+                stage.run()
+        except Exception as e:
+            print(f"✗ Stage {stage.name} failed: {type(e).__name__}: {e}")
+            return "failed", time.perf_counter() - start
+        seconds = time.perf_counter() - start
+        self.state[stage.name] = {
+            "fingerprint": fingerprint,
+            "outputs": {Path(p).as_posix(): path_digest(p) for p in stage.outputs},
+            "seconds": round(seconds, 2),
+            "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        self.save()
+        return "ran", seconds
+
+    def run(self):
+        """Runs every stage; returns {name: (status, seconds)}."""
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            while pending or running:
+                for name, stage in list(pending.items()):
+                    statuses = [results.get(dep, (None,))[0] for dep in stage.after]
+                    if any(s in ("failed", "blocked") for s in statuses):
+                        results[name] = ("blocked", 0.0)
+                        del pending[name]
+                    elif all(s in ("ran", "skipped") for s in statuses):
+                        running[pool.submit(self.run_stage, stage)] = name
+                        del pending[name]
+                if not running:
+                    # Only reachable if `after` names a missing or cyclic stage
+                    for name in pending:
+                        results[name] = ("blocked", 0.0)
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return results
+
+    def save(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(f".{self.state_path.name}.tmp")
+        tmp.write_text(json.dumps(self.state, indent=2, sort_keys=True), "utf-8")
+        os.replace(tmp, self.state_path)
+
+
+# ------------------------
+# Stages
+# ------------------------
+class MatchSession:
+    """The embedder and match manifest shared by the two matching stages."""
+
+    def __init__(self, args):
+        self.args = args
+        self._model = None
+        self._manifest = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from embedders import HashedNgramEmbedder, create_embedder
+            from matcher import load_json, normalize_title
+
+            args = self.args
+            self._model = create_embedder(
+                args.embedder, args.model, None if args.no_cache else args.cache_dir
+            )
+            if isinstance(self._model, HashedNgramEmbedder):
+                records = []
+                for path in (SCHEDULES_PATH, ATTRIBUTES_PATH, POSTER_URLS_PATH):
+                    records += load_json(path)
+                self._model.fit(normalize_title(r["title"]) for r in records)
+        return self._model
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            from matcher import MANIFEST_PATH, WEIGHTS, MatchManifest, embedder_id
+
+            # Same configuration as a plain `python scripts/matcher.py` run
+            config = {
+                **embedder_id(self.model),
+                "threshold": MATCH_THRESHOLD,
+                "weights": WEIGHTS,
+                "blocking": False,
+                "ann": False,
+                "cascade_margin": None,
+            }
+            self._manifest = MatchManifest(MANIFEST_PATH, config)
+        return self._manifest
+
+    def finish(self):
+        self.manifest.save()
+        cache = getattr(self.model, "cache", None)
+        if cache is not None:
+            cache.save()
+
+    def match(self):
+        from matcher import TitleIndex, load_json, merge_schedules_and_attributes
+
+        merged = merge_schedules_and_attributes(
+            load_json(SCHEDULES_PATH),
+            TitleIndex(load_json(ATTRIBUTES_PATH), self.model),
+            self.model,
+            MATCH_THRESHOLD,
+            manifest=self.manifest,
+        )
+        write_json(MATCHED_PATH, merged)
+        self.finish()
+
+    def merge_posters(self):
+        from matcher import TitleIndex, load_json, merge_with_posters
+
+        merged = merge_with_posters(
+            load_json(MATCHED_PATH),
+            TitleIndex(load_json(POSTER_URLS_PATH), self.model),
+            self.model,
+            MATCH_THRESHOLD,
+            manifest=self.manifest,
+        )
+        write_json(SOURCE_DATA_PATH, merged)
+        print(f"Saved {len(merged)} merged movies to {SOURCE_DATA_PATH.as_posix()}")
+        self.finish()
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+def transform():
+    subprocess.run(["node", str(SCRIPTS_DIR / "transformData.mjs")], check=True)
+
+
+def download(args):
+    from getPosters import download_posters
+
+    stats = download_posters(REFERENCE_PATH, POSTERS_DIR, max_workers=args.downloads)
+    if stats["failed"] and not (
+        stats["downloaded"] + stats["deduplicated"] + stats["not_modified"]
+    ):
+        raise RuntimeError("no poster could be downloaded")
+
+
+def render(args, posters_dir=POSTERS_DIR):
+    from getPosters import process_all_posters_for_variants
+
+    process_all_posters_for_variants(
+        posters_dir,
+        VARIANTS_DIR,
+        workers=args.workers,
+        renditions_path=RENDITIONS_PATH,
+        manifest_path=VARIANT_MANIFEST_PATH,
+        hashes_path=POSTER_HASHES_PATH,
+    )
+
+
+def render_existing(args):
+    """Renders the posters on disk now, as a snapshot the download cannot change."""
+    snapshot_posters(POSTERS_DIR, SNAPSHOT_DIR)
+    try:
+        render(args, SNAPSHOT_DIR)
+    finally:
+        shutil.rmtree(SNAPSHOT_DIR, ignore_errors=True)
+
+
+def snapshot_posters(source, target):
+    """Hardlinks (or copies) the files of `source` into an emptied `target`."""
+    shutil.rmtree(target, ignore_errors=True)
+    target.mkdir(parents=True)
+    if not source.is_dir():
+        return
+    for path in source.iterdir():
+        if path.name.startswith(".") or not path.is_file():
+            continue
+        # Files pruned by the download since iterdir() are left out
+        try:
+            os.link(path, target / path.name)
+        except FileNotFoundError:
+            continue
+        except OSError:  # e.g. no hardlinks on this file system
+            with contextlib.suppress(FileNotFoundError):
+                shutil.copyfile(path, target / path.name)
+
+
+def build_stages(args):
+    session = MatchSession(args)
+    embedder = {"embedder": args.embedder, "model": args.model}
+    match_code = [
+        SCRIPTS_DIR / name
+        for name in ("matcher.py", "embedders.py", "embedding_cache.py")
+    ]
+    poster_code = [
+        SCRIPTS_DIR / name
+        for name in ("getPosters.py", "poster_downloader.py", "poster_hashes.py")
+    ]
+    # The hashed embedder fits its IDF on all titles, poster titles included
+    idf_inputs = [POSTER_URLS_PATH] if args.embedder == "hashed" else []
+    render_inputs = [POSTERS_DIR, *LOGO_FILES]
+    return [
+        Stage(
+            "match",
+            session.match,
+            inputs=[SCHEDULES_PATH, ATTRIBUTES_PATH, *idf_inputs],
+            outputs=[MATCHED_PATH],
+            code=match_code,
+            settings=embedder,
+        ),
+        Stage(
+            "merge_posters",
+            session.merge_posters,
+            inputs=[MATCHED_PATH, POSTER_URLS_PATH],
+            outputs=[SOURCE_DATA_PATH],
+            after=("match",),
+            code=match_code,
+            settings=embedder,
+        ),
+        Stage(
+            "transform",
+            transform,
+            inputs=[SOURCE_DATA_PATH],
+            outputs=TRANSFORM_OUTPUTS,
+            after=("merge_posters",),
+            code=[SCRIPTS_DIR / "transformData.mjs", SCRIPTS_DIR / "utils.mjs"],
+        ),
+        Stage(
+            "download",
+            lambda: download(args),
+            inputs=[REFERENCE_PATH],
+            outputs=[POSTERS_DIR],
+            after=("transform",),
+            code=poster_code,
+        ),
+        Stage(
+            "render_existing",
+            lambda: render_existing(args),
+            inputs=render_inputs,
+            outputs=[
+                VARIANTS_DIR,
+                RENDITIONS_PATH,
+                VARIANT_MANIFEST_PATH,
+                POSTER_HASHES_PATH,
+            ],
+            code=poster_code,
+        ),
+        Stage(
+            "render",
+            lambda: render(args),
+            inputs=render_inputs,
+            outputs=[
+                VARIANTS_DIR,
+                RENDITIONS_PATH,
+                VARIANT_MANIFEST_PATH,
+                POSTER_HASHES_PATH,
+            ],
+            after=("download", "render_existing"),
+            code=poster_code,
+        ),
+    ]
+
+
+def print_summary(results, wall_seconds):
+    print("\n=== PIPELINE SUMMARY ===")
+    for name, (status, seconds) in results.items():
+        print(f"{name:<16} {status:<8} {seconds:7.1f}s")
+    print(f"{'total':<16} {'':<8} {wall_seconds:7.1f}s wall")
+
+
+# ------------------------
+# Main Execution
+# ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run match, merge, transform, download and render stages, "
+        "skipping those whose inputs did not change."
+    )
+    parser.add_argument(
+        "--force",
+        nargs="*",
+        metavar="STAGE",
+        help="Run these stages (all without names) even if they are up to date",
+    )
+    parser.add_argument(
+        "--embedder", default="sentence-transformers", help="Title embedding backend"
+    )
+    parser.add_argument(
+        "--model",
+        default="paraphrase-multilingual-MiniLM-L12-v2",
+        help="SentenceTransformer model",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=".cache/embeddings",
+        help="Directory of the persistent embedding cache",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Always embed titles with the model"
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Variant rendering processes (default: cores)"
+    )
+    parser.add_argument(
+        "--downloads", type=int, default=8, help="Concurrent poster downloads"
+    )
+    args = parser.parse_args()
+
+    # Stages run in threads; render workers must not be forked from a
+    # process whose other threads may hold locks (e.g. stdout's)
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        multiprocessing.set_start_method("forkserver")
+
+    stages = build_stages(args)
+    force = [s.name for s in stages] if args.force == [] else args.force or []
+    unknown = set(force) - {s.name for s in stages}
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    results = Pipeline(stages, force=force).run()
+    print_summary(results, time.perf_counter() - start)
+
+    # Stage times and counters of everything that ran, to compare weekly runs
+    for status, _ in results.values():
+        REPORT.count(f"pipeline_stages_{status}")
+    REPORT.write(REPORT_PATH)
+    print(f"Saved run report to {REPORT_PATH.as_posix()}")
+    sys.exit(1 if any(status == "failed" for status, _ in results.values()) else 0)
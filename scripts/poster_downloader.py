@@ -0,0 +1,487 @@
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# ------------------------
+# Concurrent Poster Downloads
+# ------------------------
+# A thread pool shares one requests.Session, so connections to the image CDN
+# are kept alive and reused. Politeness comes from a token bucket per host
+# instead of a sleep after every file: short bursts are allowed, the long-run
+# request rate per host is capped. 429 and 5xx responses and connection
+# errors are retried with exponential backoff (honouring Retry-After).
+#
+# With a PosterManifest, posters already on disk are revalidated with
+# If-None-Match / If-Modified-Since, so an unchanged poster costs a 304 without
+# a body while a replaced one is downloaded again.
+#
+# Bodies are streamed in CHUNK_SIZE pieces to `<file>.part` and only renamed
+# over the poster once their length matches Content-Length. A transfer that
+# breaks off is continued with a Range request (guarded by If-Range), so peak
+# memory is one chunk and a truncated file never takes a poster's name.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHUNK_SIZE = 64 * 1024
+# Errors while reading a streamed body, after which the download is resumed
+STREAM_ERRORS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.ConnectionError,
+    requests.Timeout,
+)
+
+
+class IncompleteDownload(requests.RequestException):
+    """The body ended before the announced Content-Length was reached."""
+
+
+class NotAnImage(requests.RequestException):
+    """The server answered with something other than an image."""
+
+
+# Statuses with which an image CDN refuses a resize/transcode request
+REFUSED_STATUSES = {400, 403, 404, 415, 422, 501}
+
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, bursts up to `burst`."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostRateLimiter:
+    """One TokenBucket per host, created on first use."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                bucket = self.buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
+
+
+@dataclass
+class DownloadJob:
+    title: str
+    slug: str
+    url: str
+    path: str
+    # Tried when `url` is refused, e.g. the original behind a resized URL
+    fallback_url: str = None
+
+
+@dataclass
+class DownloadResult:
+    job: DownloadJob
+    ok: bool
+    bytes: int = 0
+    seconds: float = 0.0
+    error: str = None
+    # "downloaded", "not_modified", "deduplicated" or "failed"
+    status: str = "downloaded"
+
+
+@dataclass
+class DownloadStats:
+    """Per-run totals; requests and retries are counted from worker threads."""
+
+    requests: int = 0
+    retries: int = 0
+    downloaded: int = 0
+    resumed: int = 0
+    fallbacks: int = 0
+    not_modified: int = 0
+    deduplicated: int = 0
+    failed: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, **counts):
+        with self.lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "downloaded": self.downloaded,
+            "resumed": self.resumed,
+            "fallbacks": self.fallbacks,
+            "not_modified": self.not_modified,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "files_per_second": (
+                round(self.downloaded / self.seconds, 2) if self.seconds else None
+            ),
+            "mb_per_second": (
+                round(self.bytes / 1e6 / self.seconds, 3) if self.seconds else None
+            ),
+        }
+
+
+# ------------------------
+# Conditional Request Manifest
+# ------------------------
+# {slug: {"url", "file", "etag", "last_modified", "sha1", "size"}}, rewritten
+# atomically after every run. "file" is relative to the posters directory.
+class PosterManifest:
+    """Validators and content hashes of the posters on disk, by slug."""
+
+    def __init__(self, path, directory):
+        self.path = Path(path)
+        self.directory = Path(directory)
+        self.entries = {}
+        self.lock = threading.Lock()
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except ValueError as e:
+                print(f"Warning: Ignoring unreadable poster manifest: {e}")
+
+    def conditional_headers(self, job):
+        """Revalidation headers if the stored entry still describes job.path."""
+        entry = self.entries.get(job.slug)
+        if (
+            entry is None
+            or entry["url"] != job.url
+            or self.directory / entry["file"] != Path(job.path)
+            or not os.path.exists(job.path)
+            or os.path.getsize(job.path) != entry["size"]
+        ):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def file_with_hash(self, sha1, exclude):
+        """Path of another stored poster with this content, if any."""
+        with self.lock:
+            for entry in self.entries.values():
+                path = self.directory / entry["file"]
+                if (
+                    entry["sha1"] == sha1
+                    and path != Path(exclude)
+                    and path.exists()
+                    and path.stat().st_size == entry["size"]
+                ):
+                    return path
+        return None
+
+    def update(self, job, response, sha1, size):
+        with self.lock:
+            self.entries[job.slug] = {
+                "url": job.url,
+                "file": Path(job.path).relative_to(self.directory).as_posix(),
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "sha1": sha1,
+                "size": size,
+            }
+
+    def remove(self, slug):
+        with self.lock:
+            self.entries.pop(slug, None)
+
+    def save(self):
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(
+            json.dumps(self.entries, indent=2, sort_keys=True, ensure_ascii=False),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
+
+
+def expected_length(response):
+    """Total body size announced by a 200 or 206 response, or None."""
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None  # requests decodes the body, the lengths differ
+    if response.status_code == 206:
+        total = response.headers.get("Content-Range", "").rpartition("/")[2]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+
+def range_start(response):
+    """First byte position of a 206 response's Content-Range, or None."""
+    content_range = response.headers.get("Content-Range", "")
+    unit, _, spec = content_range.partition(" ")
+    start = spec.partition("-")[0]
+    return int(start) if unit == "bytes" and start.isdigit() else None
+
+
+def retry_after_seconds(response):
+    """Delay requested by a Retry-After header (seconds or HTTP date), or None."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class PosterDownloader:
+    """
+    Downloads poster jobs concurrently over a shared, pooled session.
+
+    Args:
+        max_workers (int): Concurrent downloads
+        rate_per_host (float): Average requests per second per host
+        burst (int): Requests a host may receive back to back
+        max_retries (int): Retries after a 429/5xx response or network error
+        backoff (float): First retry delay in seconds, doubled per attempt
+        timeout (float): Connect/read timeout per request in seconds
+    """
+
+    def __init__(
+        self,
+        max_workers=8,
+        rate_per_host=4.0,
+        burst=4,
+        max_retries=4,
+        backoff=0.5,
+        max_backoff=30.0,
+        timeout=30,
+        session=None,
+        manifest=None,
+    ):
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(rate_per_host, burst)
+        self.stats = DownloadStats()
+        self.manifest = manifest
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+    def _delay(self, attempt, response=None):
+        delay = retry_after_seconds(response) if response is not None else None
+        if delay is None:
+            delay = self.backoff * 2**attempt
+            delay *= 0.5 + random.random()  # jitter, so workers do not sync up
+        return min(delay, self.max_backoff)
+
+    def request(self, url, headers=None, stream=False):
+        """
+        GET with rate limiting and retries. Returns (response, attempts).
+
+        The last response is returned as is once the retries are used up;
+        network errors are re-raised.
+        """
+        attempt = 0
+        while True:
+            self.limiter.acquire(url)
+            self.stats.add(requests=1)
+            try:
+                response = self.session.get(
+                    url, headers=headers, timeout=self.timeout, stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._delay(attempt))
+            else:
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or attempt >= self.max_retries
+                ):
+                    return response, attempt + 1
+                response.close()
+                time.sleep(self._delay(attempt, response))
+            attempt += 1
+            self.stats.add(retries=1)
+
+    def fetch_to_file(self, url, path, headers):
+        """
+        Streams url into path, resuming with Range requests after breaks.
+
+        Returns (last response, sha1, size), or None if the conditional
+        request was answered with 304. Raises once the body still cannot be
+        completed after max_retries resumes.
+        """
+        received, resumes = 0, 0
+        digest = hashlib.sha1()
+        validator = None
+        with open(path, "wb") as part:
+            while True:
+                request_headers = dict(headers)
+                if received:
+                    # Conditional headers would turn a changed poster into a
+                    # 304; If-Range restarts the body instead
+                    request_headers = {"Range": f"bytes={received}-"}
+                    if validator:
+                        request_headers["If-Range"] = validator
+                response, _ = self.request(url, headers=request_headers, stream=True)
+                with response:
+                    if response.status_code == 304 and headers and not received:
+                        return None
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type", "image/")
+                    if not content_type.startswith("image/"):
+                        raise NotAnImage(f"{url} returned {content_type}")
+                    if received and (
+                        response.status_code != 206 or range_start(response) != received
+                    ):
+                        part.seek(0)
+                        part.truncate()
+                        received, digest = 0, hashlib.sha1()
+                    validator = response.headers.get("ETag") or response.headers.get(
+                        "Last-Modified"
+                    )
+                    total = expected_length(response)
+                    try:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            part.write(chunk)
+                            digest.update(chunk)
+                            received += len(chunk)
+                        if total is not None and received != total:
+                            raise IncompleteDownload(
+                                f"Received {received} of {total} bytes from {url}"
+                            )
+                        return response, digest.hexdigest(), received
+                    except STREAM_ERRORS + (IncompleteDownload,):
+                        if resumes >= self.max_retries:
+                            raise
+                        if total is not None and received > total:
+                            part.seek(0)
+                            part.truncate()
+                            received, digest = 0, hashlib.sha1()
+                resumes += 1
+                self.stats.add(resumed=1)
+                time.sleep(self._delay(resumes - 1))
+
+    def download(self, job):
+        """
+        Fetches one job's URL and atomically replaces job.path with the body.
+
+        With a manifest the request is conditional; on 304 the file is left
+        alone, and a body identical to another stored poster is hard-linked
+        to that file instead of being kept as a second copy.
+        """
+        start = time.perf_counter()
+        headers = self.manifest.conditional_headers(job) if self.manifest else {}
+        tmp_path = f"{job.path}.part"
+        try:
+            try:
+                fetched = self.fetch_to_file(job.url, tmp_path, headers)
+            except (requests.HTTPError, NotAnImage) as e:
+                status = getattr(e.response, "status_code", None)
+                if not job.fallback_url or not (
+                    isinstance(e, NotAnImage) or status in REFUSED_STATUSES
+                ):
+                    raise
+                self.stats.add(fallbacks=1)
+                job.url, job.fallback_url = job.fallback_url, None
+                headers = (
+                    self.manifest.conditional_headers(job) if self.manifest else {}
+                )
+                fetched = self.fetch_to_file(job.url, tmp_path, headers)
+            if fetched is None:
+                os.remove(tmp_path)
+                self.stats.add(not_modified=1)
+                return DownloadResult(
+                    job,
+                    True,
+                    0,
+                    seconds=time.perf_counter() - start,
+                    status="not_modified",
+                )
+            response, sha1, size = fetched
+
+            duplicate = (
+                self.manifest.file_with_hash(sha1, job.path) if self.manifest else None
+            )
+            if duplicate is not None:
+                os.remove(tmp_path)
+                try:
+                    os.link(duplicate, tmp_path)
+                except OSError:
+                    shutil.copyfile(duplicate, tmp_path)
+            os.replace(tmp_path, job.path)
+            if self.manifest:
+                self.manifest.update(job, response, sha1, size)
+
+            status = "deduplicated" if duplicate is not None else "downloaded"
+            self.stats.add(**{status: 1}, bytes=size)
+            return DownloadResult(
+                job, True, size, seconds=time.perf_counter() - start, status=status
+            )
+        except (requests.RequestException, OSError) as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self.stats.add(failed=1)
+            return DownloadResult(
+                job,
+                False,
+                seconds=time.perf_counter() - start,
+                error=str(e),
+                status="failed",
+            )
+
+    def download_all(self, jobs):
+        """Runs all jobs, yielding DownloadResults as they complete."""
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [pool.submit(self.download, job) for job in jobs]
+                for future in as_completed(futures):
+                    yield future.result()
+        finally:
+            self.stats.seconds += time.perf_counter() - start
@@ -0,0 +1,159 @@
+import json
+import os
+from pathlib import Path
+
+from PIL import Image
+
+# ------------------------
+# Perceptual Poster Hashes
+# ------------------------
+# 64-bit difference hashes (dHash) of the source posters, so that placeholder
+# artwork and the same poster saved under several slugs are recognized
+# before the posters are decoded at full size and rendered. A dHash compares
+# neighbouring pixels of a 9x8 grayscale thumbnail: re-encoding, resizing or
+# a CDN recompression flip only a few bits, different posters differ in
+# about half of them (the closest distinct pair of a typical week is 14
+# bits apart, exact copies are 0 apart).
+#
+# Hashes are cached in <posters_dir>.hashes.json by content sha1, so every
+# poster file is only thumbnailed once. Lookups use multi-index hashing: the
+# hash is split into max_distance + 1 bands, and two hashes within
+# max_distance bits agree exactly on at least one band (pigeonhole), so only
+# posters sharing a band are compared instead of the whole archive.
+#
+# Known placeholder artwork is given as reference images; the index file may
+# list further placeholder hashes (hex) under "placeholders".
+
+HASH_SIZE = 8
+MAX_DISTANCE = 6
+
+
+def dhash(path, hash_size=HASH_SIZE):
+    """(hash, width, height) of an image file, decoding as little as possible."""
+    with Image.open(path) as img:
+        size = img.size
+        # JPEGs decode at up to 1/8 scale
+        img.draft("L", (hash_size * 8, hash_size * 8))
+        thumbnail = img.convert("L").resize(
+            (hash_size + 1, hash_size), Image.Resampling.BILINEAR
+        )
+    pixels = thumbnail.tobytes()
+    value = 0
+    for y in range(hash_size):
+        row = pixels[y * (hash_size + 1) : (y + 1) * (hash_size + 1)]
+        for x in range(hash_size):
+            value = value << 1 | (row[x] > row[x + 1])
+    return value, size[0], size[1]
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """Near-neighbour lookups of keyed hashes within max_distance bits."""
+
+    def __init__(self, bits=HASH_SIZE * HASH_SIZE, max_distance=MAX_DISTANCE):
+        self.max_distance = max_distance
+        n_bands = max_distance + 1
+        edges = [round(i * bits / n_bands) for i in range(n_bands + 1)]
+        self.bands = [
+            (low, (1 << (high - low)) - 1) for low, high in zip(edges, edges[1:])
+        ]
+        self.buckets = {}  # (band, band value) -> [key, ...]
+        self.hashes = {}
+
+    def add(self, key, value):
+        self.hashes[key] = value
+        for band, (shift, mask) in enumerate(self.bands):
+            self.buckets.setdefault((band, value >> shift & mask), []).append(key)
+
+    def near(self, value):
+        """[(distance, key)] of all indexed hashes within max_distance, closest first."""
+        candidates = set()
+        for band, (shift, mask) in enumerate(self.bands):
+            candidates.update(self.buckets.get((band, value >> shift & mask), ()))
+        matches = []
+        for key in candidates:
+            distance = hamming(value, self.hashes[key])
+            if distance <= self.max_distance:
+                matches.append((distance, key))
+        return sorted(matches)
+
+
+class PosterHashes:
+    """Cached dHashes of poster files, by content sha1."""
+
+    def __init__(self, path, max_distance=MAX_DISTANCE):
+        self.path = Path(path)
+        self.max_distance = max_distance
+        self.entries = {}  # sha1 -> {"dhash", "width", "height"}
+        self.placeholders = []
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                self.entries = data.get("posters", {})
+                self.placeholders = data.get("placeholders", [])
+            except ValueError as e:
+                print(f"Warning: Ignoring unreadable poster hash index: {e}")
+
+    def lookup(self, path, sha1):
+        """(hash, width, height) of a poster, from the cache if possible."""
+        entry = self.entries.get(sha1)
+        if entry is None:
+            value, width, height = dhash(path)
+            entry = {"dhash": f"{value:016x}", "width": width, "height": height}
+            self.entries[sha1] = entry
+        return int(entry["dhash"], 16), entry["width"], entry["height"]
+
+    def group(self, sources, placeholder_images=()):
+        """
+        Canonical slug of every poster, and the slugs showing a placeholder.
+
+        `sources` maps slug -> (path, sha1). Posters within max_distance of
+        each other share the canonical slug of the largest one among them
+        (ties: the first slug alphabetically); unique posters are their own
+        canonical slug. All posters matching a placeholder form one group.
+        """
+        hashes = {slug: self.lookup(*source) for slug, source in sources.items()}
+        reference = HashIndex(max_distance=self.max_distance)
+        for i, value in enumerate(int(h, 16) for h in self.placeholders):
+            reference.add(f"placeholder {i}", value)
+        for image in placeholder_images:
+            if os.path.exists(image):
+                reference.add(image, dhash(image)[0])
+
+        placeholders = {slug for slug, h in hashes.items() if reference.near(h[0])}
+        # Largest poster first, so it becomes the canonical one of its group
+        order = sorted(hashes, key=lambda s: (-hashes[s][1] * hashes[s][2], s))
+        canonical = {}
+        index = HashIndex(max_distance=self.max_distance)
+        placeholder_canonical = None
+        for slug in order:
+            if slug in placeholders:
+                placeholder_canonical = placeholder_canonical or slug
+                canonical[slug] = placeholder_canonical
+                continue
+            matches = index.near(hashes[slug][0])
+            if matches:
+                canonical[slug] = matches[0][1]
+            else:
+                canonical[slug] = slug
+                index.add(slug, hashes[slug][0])
+
+        # Only keep the posters on disk, the index stays small
+        current = {sha1 for _, sha1 in sources.values()}
+        self.entries = {k: v for k, v in self.entries.items() if k in current}
+        return canonical, placeholders
+
+    def save(self):
+        tmp = self.path.with_name(f".{self.path.name}.tmp")
+        tmp.write_text(
+            json.dumps(
+                {"placeholders": self.placeholders, "posters": self.entries},
+                indent=2,
+                sort_keys=True,
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self.path)
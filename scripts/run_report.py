@@ -0,0 +1,183 @@
+import json
+import random
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# ------------------------
+# Run Report
+# ------------------------
+# Stage timings, counters and value distributions for one script run. The
+# scripts share the module-level REPORT, so a stage can be timed wherever it
+# happens without passing a report object through every call.
+def peak_rss_mb(children=False):
+    """
+    Peak resident set size of this process in MB (None where unsupported).
+
+    With `children`, the largest peak of its finished child processes, e.g.
+    the workers of a process pool that has been shut down.
+    """
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(values, totals=None):
+    """
+    Count, min, max, mean and percentiles of a list of numbers.
+
+    `totals` ({"count", "min", "max", "sum"} over all values) is given when
+    `values` is only a sample of them; the percentiles then come from the
+    sample and the rest from the totals.
+    """
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    if totals is None:
+        totals = {
+            "count": len(ordered),
+            "min": ordered[0],
+            "max": ordered[-1],
+            "sum": sum(ordered),
+        }
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": totals["count"],
+        "min": round(totals["min"], 4),
+        "p10": round(pick(0.1), 4),
+        "p50": round(pick(0.5), 4),
+        "p90": round(pick(0.9), 4),
+        "max": round(totals["max"], 4),
+        "mean": round(totals["sum"] / totals["count"], 4),
+    }
+
+
+class RunReport:
+    """Collects wall time and call counts per stage plus free-form counters."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.values = {}
+        self.value_totals = {}
+        self.items = {}
+        # Per list; later items are only counted and distributions keep a
+        # random sample of this many values for their percentiles
+        self.max_items = None
+        self._sampler = random.Random(0)
+
+    def reset(self):
+        """Starts over, e.g. after a warm-up run."""
+        self.__init__()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += time.perf_counter() - start
+            stage["calls"] += 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record(self, name, value):
+        """Adds one sample to the distribution `name`."""
+        values = self.values.setdefault(name, [])
+        totals = self.value_totals.setdefault(
+            name, {"count": 0, "min": value, "max": value, "sum": 0.0}
+        )
+        totals["count"] += 1
+        totals["min"] = min(totals["min"], value)
+        totals["max"] = max(totals["max"], value)
+        totals["sum"] += value
+        if self.max_items is None or len(values) < self.max_items:
+            values.append(value)
+            return
+        # Reservoir sampling: every value so far is kept with equal chance
+        slot = self._sampler.randrange(totals["count"])
+        if slot < self.max_items:
+            values[slot] = value
+
+    def add_item(self, name, item):
+        """Appends one detail record (e.g. a single match) to the list `name`."""
+        items = self.items.setdefault(name, [])
+        if self.max_items is not None and len(items) >= self.max_items:
+            self.count(f"{name}_dropped")
+            return
+        items.append(item)
+
+    def snapshot(self):
+        """Copy of the stage totals and counters, see `since`."""
+        return {
+            "stages": {name: dict(s) for name, s in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def since(self, snapshot):
+        """
+        Stage totals and counters added after `snapshot`.
+
+        Worker processes have their own REPORT; they return this with their
+        result and the parent adds it to its REPORT with `merge`.
+        """
+        stages = {}
+        for name, s in self.stages.items():
+            before = snapshot["stages"].get(name, {"seconds": 0.0, "calls": 0})
+            if s["calls"] > before["calls"]:
+                stages[name] = {
+                    "seconds": s["seconds"] - before["seconds"],
+                    "calls": s["calls"] - before["calls"],
+                }
+        counters = {
+            name: n - snapshot["counters"].get(name, 0)
+            for name, n in self.counters.items()
+            if n != snapshot["counters"].get(name, 0)
+        }
+        return {"stages": stages, "counters": counters}
+
+    def merge(self, delta):
+        for name, s in delta["stages"].items():
+            stage = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0})
+            stage["seconds"] += s["seconds"]
+            stage["calls"] += s["calls"]
+        for name, n in delta["counters"].items():
+            self.count(name, n)
+
+    def to_dict(self):
+        return {
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_seconds": round(time.time() - self.started, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_children_mb": peak_rss_mb(children=True),
+            "stages": {
+                name: {"seconds": round(s["seconds"], 4), "calls": s["calls"]}
+                for name, s in self.stages.items()
+            },
+            "counters": self.counters,
+            "distributions": {
+                k: summarize(v, self.value_totals[k]) for k, v in self.values.items()
+            },
+            **self.items,
+        }
+
+    def write(self, path):
+        Path(path).write_text(
+            json.dumps(self.to_dict(), indent=2, ensure_ascii=False), encoding="utf-8"
+        )
+
+
+REPORT = RunReport()
@@ -0,0 +1,125 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# ------------------------
+# Variant Visual Diff
+# ------------------------
+# Compares two renders of the poster variants pixel by pixel, e.g. before and
+# after a change to the imaging code, and fails if any variant deviates more
+# than the bounds allow:
+#
+#   cp -r public/poster-variants /tmp/reference   # rendered by the old code
+#   python scripts/getPosters.py                   # renders with the new code
+#   python scripts/variant_diff.py /tmp/reference public/poster-variants
+#
+# Per image: mean absolute error and PSNR over the RGB channels (0-255), and
+# the share of pixels off by more than --pixel-tolerance.
+
+VARIANT_TYPES = ("og", "square")
+
+
+def compare_images(reference_path, candidate_path, pixel_tolerance):
+    with Image.open(reference_path) as reference, Image.open(candidate_path) as other:
+        if reference.size != other.size:
+            return {"error": f"size {other.size} != {reference.size}"}
+        a = np.asarray(reference.convert("RGB"), dtype=np.float32)
+        b = np.asarray(other.convert("RGB"), dtype=np.float32)
+    difference = np.abs(a - b)
+    mse = float((difference**2).mean())
+    return {
+        "mean_error": float(difference.mean()),
+        "psnr": float("inf") if mse == 0 else 10 * np.log10(255**2 / mse),
+        "pixels_off": float((difference.max(axis=2) > pixel_tolerance).mean()),
+    }
+
+
+def compare_directories(reference_dir, candidate_dir, pixel_tolerance=32):
+    """
+    {"og/slug.png": metrics} for every variant of the reference render.
+
+    Files are matched by slug, so renders in different formats (PNG before,
+    JPEG after) can be compared.
+    """
+    results = {}
+    for variant_type in VARIANT_TYPES:
+        candidates = {
+            path.stem: path for path in Path(candidate_dir, variant_type).glob("*.*")
+        }
+        for reference_path in sorted(Path(reference_dir, variant_type).glob("*.*")):
+            name = f"{variant_type}/{reference_path.name}"
+            candidate_path = candidates.get(reference_path.stem)
+            if candidate_path is None:
+                results[name] = {"error": "missing"}
+                continue
+            results[name] = compare_images(
+                reference_path, candidate_path, pixel_tolerance
+            )
+    return results
+
+
+def violations(results, max_mean_error, min_psnr, max_pixels_off):
+    """Human-readable reasons why images are outside the bounds."""
+    problems = []
+    for name, metrics in results.items():
+        if "error" in metrics:
+            problems.append(f"{name}: {metrics['error']}")
+            continue
+        if metrics["mean_error"] > max_mean_error:
+            problems.append(f"{name}: mean error {metrics['mean_error']:.2f}")
+        if metrics["psnr"] < min_psnr:
+            problems.append(f"{name}: PSNR {metrics['psnr']:.1f} dB")
+        if metrics["pixels_off"] > max_pixels_off:
+            problems.append(f"{name}: {metrics['pixels_off']:.2%} pixels off")
+    return problems
+
+
+# ------------------------
+# Main Execution
+# ------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bound the pixel difference between two variant renders."
+    )
+    parser.add_argument("reference", help="Variants directory rendered before")
+    parser.add_argument("candidate", help="Variants directory rendered after")
+    parser.add_argument("--max-mean-error", type=float, default=2.0)
+    parser.add_argument("--min-psnr", type=float, default=35.0)
+    parser.add_argument(
+        "--pixel-tolerance",
+        type=int,
+        default=32,
+        help="Channel difference above which a pixel counts as off",
+    )
+    parser.add_argument(
+        "--max-pixels-off",
+        type=float,
+        default=0.005,
+        help="Largest allowed share of pixels off per image",
+    )
+    parser.add_argument("--output", help="Write the per-image metrics as JSON")
+    args = parser.parse_args()
+
+    results = compare_directories(args.reference, args.candidate, args.pixel_tolerance)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+    measured = [m for m in results.values() if "error" not in m]
+    if measured:
+        worst = min(measured, key=lambda m: m["psnr"])
+        print(
+            f"Compared {len(results)} variants: mean error "
+            f"{np.mean([m['mean_error'] for m in measured]):.2f}, "
+            f"worst PSNR {worst['psnr']:.1f} dB, max pixels off "
+            f"{max(m['pixels_off'] for m in measured):.2%}"
+        )
+    problems = violations(
+        results, args.max_mean_error, args.min_psnr, args.max_pixels_off
+    )
+    for problem in problems:
+        print(f"✗ {problem}")
+    sys.exit(1 if problems else 0)
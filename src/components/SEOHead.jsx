@@ -40,16 +40,16 @@ const SEOHead = ({
                 ? ` am ${formattedDate}`
                 : `, ${formattedDate.toLowerCase()}`) +
             ` um ${showData.show.time}h in Tübingen mit mir an. Klicke hier für mehr Infos!`;
-        primaryImage = `https://kinoschurke.de/poster-variants/og/${showMovieSlug}.png`;
-        twitterImage = `https://kinoschurke.de/poster-variants/square/${showMovieSlug}.png`;
+        primaryImage = `https://kinoschurke.de/poster-variants/og/${showMovieSlug}.jpg`;
+        twitterImage = `https://kinoschurke.de/poster-variants/square/${showMovieSlug}.jpg`;
     }
     // Priority 2: If no show parameter but we have movie data from props
     else if (movieTitle && movieSlug) {
         pageTitle = `${movieTitle} - Kinoschurke`;
         pageDescription = `Alle Vorstellungen von "${movieTitle}" in Tübingen.`;
         // Use the same domain as your primary domain (no www)
-        primaryImage = `https://kinoschurke.de/poster-variants/og/${movieSlug}.png`;
-        twitterImage = `https://kinoschurke.de/poster-variants/square/${movieSlug}.png`;
+        primaryImage = `https://kinoschurke.de/poster-variants/og/${movieSlug}.jpg`;
+        twitterImage = `https://kinoschurke.de/poster-variants/square/${movieSlug}.jpg`;
     } else if (eventName) {
         pageTitle = `${eventName} - Kinoschurke`;
         pageDescription = `Alle "${eventName}" Vorstellungen in Tübingen.`;
@@ -74,7 +74,10 @@ const SEOHead = ({
 
             {/* Single primary OG image */}
             <meta property="og:image" content={primaryImage} />
-            <meta property="og:image:type" content="image/png" />
+            <meta
+                property="og:image:type"
+                content={primaryImage.endsWith(".jpg") ? "image/jpeg" : "image/png"}
+            />
             <meta property="og:image:width" content="1200" />
             <meta property="og:image:height" content="630" />
             <meta